@@ -1,63 +1,168 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Form
+from fastapi.responses import ORJSONResponse
 from bson import ObjectId
+from bson.errors import InvalidId
+from bson.regex import Regex
+from pymongo import ReturnDocument, UpdateOne, DeleteOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 from typing import List, Optional
-from app.database import users_collection, system_settings_collection, exam_files_collection, exam_categories_collection
-from app.dependencies import get_current_user, require_roles
-from app.models import UserOut, ExamFileCreate, ExamFileUpdate, ExamFileOut, UpdateProfile, AdminUserOut, UpdateUserRole, ExamCategoryCreate, ExamCategoryUpdate, ExamCategoryOut
+from app.database import users_collection, system_settings_collection, exam_files_collection, exam_categories_collection, redis_client, ready_unique_indexes, CATEGORY_NAME_UNIQUE, CASE_INSENSITIVE, user_search_fields, USER_SEARCH_FIELDS
+from app.dependencies import get_current_user, require_roles, invalidate_cached_users, bump_exams_version
+from app.models import UserOut, ExamFileCreate, ExamFileUpdate, ExamFileOut, UpdateProfile, AdminUserOut, UpdateUserRole, ExamCategoryCreate, ExamCategoryUpdate, ExamCategoryOut, AdminUserPage, ExamFilePage
+from app.storage import r2_client
 from app.storage.r2_client import upload_to_r2, R2_CONFIGURED
+from app.storage.s3_client import upload_to_s3, S3_CONFIGURED
 from datetime import datetime
-from app.settings import ADMIN_ROLE, ALL_ROLES
+from app.settings import ADMIN_ROLE, ALL_ROLES, R2_ENDPOINT_URL, R2_ACCESS_KEY, R2_SECRET_KEY, R2_BUCKET_NAME
+import asyncio
+import base64
 import json
+import logging
+import orjson
+import re
+import traceback
 
 router = APIRouter(
     prefix="/admin/api/v1",
     tags=["Admin"]
 )
 
+logger = logging.getLogger("admin")
+
+# Fields actually rendered by AdminUserOut / ExamFileOut; keeps hashed_password etc. off the wire
+ADMIN_USER_PROJECTION = {"email": 1, "username": 1, "full_name": 1, "roles": 1, "bio": 1, "profile_image": 1, "created_at": 1}
+EXAM_FILE_PROJECTION = {"title": 1, "description": 1, "tags": 1, "url": 1, "uploaded_by": 1, "essay_count": 1, "choice_count": 1}
+
 # Helper
 def to_str_id(doc):
     doc["id"] = str(doc["_id"])
     del doc["_id"]
     return doc
 
+# List endpoints build plain dicts and return ORJSONResponse directly, skipping the
+# per-row Pydantic round-trip; the response_model is still used for the OpenAPI schema.
+def admin_user_dict(user: dict) -> dict:
+    return {
+        "id": str(user["_id"]),
+        "email": user["email"],
+        "full_name": user.get("full_name", ""),
+        "username": user.get("username", ""),
+        "roles": user.get("roles", []),
+        "bio": user.get("bio", ""),
+        "profile_image": user.get("profile_image", ""),
+        "created_at": user.get("created_at")
+    }
+
+def exam_file_dict(file_doc: dict) -> dict:
+    return {
+        "id": str(file_doc["_id"]),
+        "title": file_doc["title"],
+        "description": file_doc["description"],
+        "tags": file_doc.get("tags", []),
+        "url": file_doc["url"],
+        "uploaded_by": file_doc["uploaded_by"],
+        "essay_count": file_doc.get("essay_count", 0),
+        "choice_count": file_doc.get("choice_count", 0)
+    }
+
+# Bulk user operations are split into sub-batches this size and sent concurrently,
+# keeping each `$in` well under the 16 MB BSON command limit
+BULK_CHUNK_SIZE = 1000
+
+# Upper bound on ids per bulk request, and on chunks in flight at once so a large batch
+# can't drain the Mongo pool and time out half-way through
+BULK_MAX_IDS = 10_000
+BULK_MAX_CONCURRENCY = 4
+
+def chunked(items: list, size: int = BULK_CHUNK_SIZE) -> list:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+class ChunkFailed(Exception):
+    """A sub-batch whose bulk write failed after `committed` of its writes had already landed."""
+    def __init__(self, cause: BulkWriteError, committed: int = 0):
+        # Summarise rather than str(cause), which echoes every failed op (and its user id)
+        write_errors = cause.details.get("writeErrors", [])
+        first = write_errors[0].get("errmsg") if write_errors else "write concern error"
+        super().__init__(f"{len(write_errors)} write error(s), first: {first}")
+        self.committed = committed
+
+async def run_chunked(fn, items: list):
+    """Run *fn* over sub-batches of *items*, a few at a time.
+
+    Every chunk runs even if another fails. Returns (documents written, errors); failed
+    chunks count what they still committed if they raised ChunkFailed, otherwise nothing.
+    """
+    semaphore = asyncio.Semaphore(BULK_MAX_CONCURRENCY)
+
+    async def run(chunk):
+        async with semaphore:
+            return await fn(chunk)
+
+    results = await asyncio.gather(*[run(chunk) for chunk in chunked(items)], return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    committed = sum(getattr(r, "committed", 0) if isinstance(r, Exception) else r for r in results)
+    return committed, errors
+
+def parse_object_id(value: str, label: str) -> ObjectId:
+    """Parse a path/query ObjectId up front so malformed ids are a 400, not a DB error."""
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail=f"Invalid {label} format")
+
+def encode_cursor(oid: ObjectId) -> str:
+    """Opaque page cursor – URL-safe Base64 of the last ObjectId on the page."""
+    return base64.urlsafe_b64encode(oid.binary).decode()
+
+def decode_cursor(cursor: str) -> ObjectId:
+    try:
+        return ObjectId(base64.urlsafe_b64decode(cursor))
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def paginate(collection, query: dict, cursor: Optional[str], limit: int, projection: Optional[dict] = None, descending: bool = False):
+    """Keyset pagination on `_id`: seek past the cursor instead of skipping documents.
+
+    Fetches one extra document to know whether another page exists.
+    Returns (docs, next_cursor, has_more).
+    """
+    if cursor:
+        query["_id"] = {"$lt" if descending else "$gt": decode_cursor(cursor)}
+    direction = -1 if descending else 1
+    docs = await collection.find(query, projection).sort("_id", direction).limit(limit + 1).to_list(length=limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = encode_cursor(docs[-1]["_id"]) if has_more else None
+    return docs, next_cursor, has_more
+
 
 # === USER MANAGEMENT ===
 
-@router.get("/users", response_model=List[AdminUserOut])
+@router.get("/users", response_model=AdminUserPage)
 async def list_all_users(
     admin: dict = Depends(require_roles(ADMIN_ROLE)),
-    page: int = Query(1, ge=1, description="Page number"),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
     limit: int = Query(10, ge=1, le=100, description="Items per page"),
-    search: Optional[str] = Query(None, description="Search by email, username, or full name"),
+    search: Optional[str] = Query(None, description="Search by email, username, or full name prefix"),
     role: Optional[str] = Query(None, description="Filter by role")
 ):
     # Build query
     query = {}
     if search:
-        query["$or"] = [
-            {"email": {"$regex": search, "$options": "i"}},
-            {"username": {"$regex": search, "$options": "i"}},
-            {"full_name": {"$regex": search, "$options": "i"}}
-        ]
+        # Case-insensitive prefix match: lowercased, escaped input as an anchored, case-sensitive
+        # pattern against the lowercased `_lc` copies, so each clause seeks its own index.
+        # Built once as a BSON regex and shared by all three clauses.
+        prefix = Regex(f"^{re.escape(search.lower())}")
+        query["$or"] = [{f"{field}_lc": prefix} for field in USER_SEARCH_FIELDS]
     if role and role in ALL_ROLES:
         query["roles"] = role
     
-    # Calculate skip
-    skip = (page - 1) * limit
-    
-    users = []
-    async for user in users_collection.find(query).skip(skip).limit(limit):
-        users.append(AdminUserOut(
-            id=str(user["_id"]),
-            email=user["email"],
-            full_name=user.get("full_name", ""),
-            username=user.get("username", ""),
-            roles=user.get("roles", []),
-            bio=user.get("bio", ""),
-            profile_image=user.get("profile_image", ""),
-            created_at=user.get("created_at")
-        ))
-    return users
+    docs, next_cursor, has_more = await paginate(users_collection, query, cursor, limit, ADMIN_USER_PROJECTION)
+    return ORJSONResponse({
+        "data": [admin_user_dict(user) for user in docs],
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    })
 
 @router.get("/users/@data", response_model=AdminUserOut)
 async def get_user_detail(
@@ -70,14 +175,11 @@ async def get_user_detail(
     
     query = {}
     if user_id:
-        try:
-            query["_id"] = ObjectId(user_id)
-        except:
-            raise HTTPException(status_code=400, detail="Invalid user ID format")
+        query["_id"] = parse_object_id(user_id, "user ID")
     elif username:
         query["email"] = username  # Using email as username in login
     
-    user = await users_collection.find_one(query)
+    user = await users_collection.find_one(query, ADMIN_USER_PROJECTION)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -101,26 +203,36 @@ async def bulk_update_user_roles(
     
     if not user_ids:
         raise HTTPException(status_code=400, detail="user_ids is required")
+    if len(user_ids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_IDS} user_ids per request")
     if not role or role not in ALL_ROLES:
         raise HTTPException(status_code=400, detail=f"Invalid role. Must be one of: {ALL_ROLES}")
-    if len(user_ids) > 50:
-        raise HTTPException(status_code=400, detail="Cannot update more than 50 users at once")
-    
-    try:
-        object_ids = [ObjectId(uid) for uid in user_ids]
-        result = await users_collection.update_many(
-            {"_id": {"$in": object_ids}},
-            {"$set": {"roles": [role]}}
-        )
-        return {
-            "message": f"Successfully updated {result.modified_count} users",
-            "updated_count": result.modified_count
-        }
-    except Exception as e:
-        print(f"Bulk update error: {str(e)}")
-        print(f"User IDs: {user_ids}")
-        print(f"Role: {role}")
-        raise HTTPException(status_code=500, detail=f"Failed to update user roles: {str(e)}")
+
+    async def update_chunk(object_ids):
+        affected = await users_collection.find({"_id": {"$in": object_ids}}, {"email": 1, "username": 1}).to_list(length=None)
+        try:
+            # Independent per-user updates; unordered so the server can apply them in parallel
+            result = await users_collection.bulk_write(
+                [UpdateOne({"_id": oid}, {"$set": {"roles": [role]}}) for oid in object_ids],
+                ordered=False
+            )
+            return result.modified_count
+        except BulkWriteError as exc:
+            # Unordered, so the rest of the chunk was still applied
+            raise ChunkFailed(exc, exc.details.get("nModified", 0))
+        finally:
+            # Even a failed chunk may have partly committed; never leave stale roles cached
+            await invalidate_cached_users(affected)
+
+    object_ids = [parse_object_id(uid, "user ID") for uid in user_ids]
+    modified_count, errors = await run_chunked(update_chunk, object_ids)
+    if errors:
+        logger.error("Bulk role update to %s failed in %d chunk(s), %d users updated: %s", role, len(errors), modified_count, errors[0])
+        raise HTTPException(status_code=500, detail=f"Failed to update some user roles (at least {modified_count} users were updated)")
+    return {
+        "message": f"Successfully updated {modified_count} users",
+        "updated_count": modified_count
+    }
 
 @router.delete("/users/bulk")
 async def bulk_delete_users(
@@ -131,18 +243,30 @@ async def bulk_delete_users(
     
     if not user_ids:
         raise HTTPException(status_code=400, detail="user_ids is required")
-    if len(user_ids) > 50:
-        raise HTTPException(status_code=400, detail="Cannot delete more than 50 users at once")
-    
-    try:
-        object_ids = [ObjectId(uid) for uid in user_ids]
-        result = await users_collection.delete_many({"_id": {"$in": object_ids}})
-        return {
-            "message": f"Successfully deleted {result.deleted_count} users",
-            "deleted_count": result.deleted_count
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Failed to delete users")
+    if len(user_ids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_IDS} user_ids per request")
+
+    async def delete_chunk(object_ids):
+        affected = await users_collection.find({"_id": {"$in": object_ids}}, {"email": 1, "username": 1}).to_list(length=None)
+        try:
+            # Per-user deletes so a failure reports exactly how many went through
+            result = await users_collection.bulk_write([DeleteOne({"_id": oid}) for oid in object_ids], ordered=False)
+            return result.deleted_count
+        except BulkWriteError as exc:
+            raise ChunkFailed(exc, exc.details.get("nRemoved", 0))
+        finally:
+            # Deleted users must stop authenticating from the cache, even if the chunk failed part-way
+            await invalidate_cached_users(affected)
+
+    object_ids = [parse_object_id(uid, "user ID") for uid in user_ids]
+    deleted_count, errors = await run_chunked(delete_chunk, object_ids)
+    if errors:
+        logger.error("Bulk user delete failed in %d chunk(s), %d users deleted: %s", len(errors), deleted_count, errors[0])
+        raise HTTPException(status_code=500, detail=f"Failed to delete some users (at least {deleted_count} users were deleted)")
+    return {
+        "message": f"Successfully deleted {deleted_count} users",
+        "deleted_count": deleted_count
+    }
 
 @router.patch("/users/{user_id}/role")
 async def update_user_role(
@@ -150,76 +274,95 @@ async def update_user_role(
     role_update: UpdateUserRole, 
     admin: dict = Depends(require_roles(ADMIN_ROLE))
 ):
+    oid = parse_object_id(user_id, "user ID")
+    # Cache keys are read up front so they can be dropped even if the write errors after committing
+    user = await users_collection.find_one({"_id": oid}, {"email": 1, "username": 1})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     try:
-        result = await users_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": {"roles": [role_update.role]}}
-        )
-        if result.matched_count == 0:
-            raise HTTPException(status_code=404, detail="User not found")
-        return {"message": "User role updated successfully"}
-    except Exception as e:
-        if "invalid" in str(e).lower():
-            raise HTTPException(status_code=400, detail="Invalid user ID format")
+        result = await users_collection.update_one({"_id": oid}, {"$set": {"roles": [role_update.role]}})
+    except Exception:
         raise HTTPException(status_code=500, detail="Failed to update user role")
+    finally:
+        await invalidate_cached_users([user])
+    if not result.matched_count:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"message": "User role updated successfully"}
 
 @router.delete("/users/{user_id}")
 async def delete_user(user_id: str, admin: dict = Depends(require_roles(ADMIN_ROLE))):
+    oid = parse_object_id(user_id, "user ID")
+    user = await users_collection.find_one({"_id": oid}, {"email": 1, "username": 1})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     try:
-        result = await users_collection.delete_one({"_id": ObjectId(user_id)})
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="User not found")
-        return {"message": "User deleted successfully"}
-    except Exception as e:
-        if "invalid" in str(e).lower():
-            raise HTTPException(status_code=400, detail="Invalid user ID format")
+        result = await users_collection.delete_one({"_id": oid})
+    except Exception:
         raise HTTPException(status_code=500, detail="Failed to delete user")
+    finally:
+        await invalidate_cached_users([user])
+    if not result.deleted_count:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"message": "User deleted successfully"}
 
 @router.patch("/users/{user_id}")
 async def edit_any_user_profile(user_id: str, update: UpdateProfile, admin: dict = Depends(require_roles(ADMIN_ROLE))):
-    update_data = {k: v for k, v in update.model_dump().items() if v is not None}
+    update_data = update.model_dump(exclude_none=True, exclude_unset=True)
     if not update_data:
         raise HTTPException(status_code=400, detail="No update data provided")
 
+    oid = parse_object_id(user_id, "user ID")
+    user = await users_collection.find_one({"_id": oid}, {"email": 1, "username": 1})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     try:
-        result = await users_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": update_data}
-        )
-        if result.matched_count == 0:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        updated_user = await users_collection.find_one({"_id": ObjectId(user_id)})
-        if not updated_user:
-            raise HTTPException(status_code=404, detail="User not found after update")
-        return AdminUserOut(
-            id=str(updated_user["_id"]),
-            email=updated_user["email"],
-            username=updated_user["username"],
-            full_name=updated_user.get("full_name", ""),
-            roles=updated_user.get("roles", []),
-            bio=updated_user.get("bio", ""),
-            profile_image=updated_user.get("profile_image", ""),
-            created_at=updated_user.get("created_at")
+        updated_user = await users_collection.find_one_and_update(
+            {"_id": oid},
+            {"$set": {**update_data, **user_search_fields(update_data)}},
+            projection=ADMIN_USER_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
-    except Exception as e:
-        if "invalid" in str(e).lower():
-            raise HTTPException(status_code=400, detail="Invalid user ID format")
+    except Exception:
         raise HTTPException(status_code=500, detail="Failed to update user profile")
+    finally:
+        await invalidate_cached_users([user])
+    if not updated_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return AdminUserOut(
+        id=str(updated_user["_id"]),
+        email=updated_user["email"],
+        username=updated_user["username"],
+        full_name=updated_user.get("full_name", ""),
+        roles=updated_user.get("roles", []),
+        bio=updated_user.get("bio", ""),
+        profile_image=updated_user.get("profile_image", ""),
+        created_at=updated_user.get("created_at")
+    )
 
 # === EXAM CATEGORY MANAGEMENT ===
 
+async def check_category_name_free(name: str, exclude_id: Optional[ObjectId] = None):
+    """Explicit duplicate check, only needed while the unique name index is missing."""
+    if CATEGORY_NAME_UNIQUE in ready_unique_indexes:
+        return
+    query = {"name": name}
+    if exclude_id:
+        query["_id"] = {"$ne": exclude_id}
+    if await exam_categories_collection.find_one(query, {"_id": 1}, collation=CASE_INSENSITIVE):
+        raise HTTPException(status_code=400, detail="Category name already exists.")
+
 @router.post("/exam-categories", response_model=ExamCategoryOut)
 async def create_exam_category(
     category: ExamCategoryCreate,
     admin: dict = Depends(require_roles(ADMIN_ROLE))
 ):
-    # Check for duplicate category name (case-insensitive)
-    existing = await exam_categories_collection.find_one({"name": {"$regex": f"^{category.name}$", "$options": "i"}})
-    if existing:
-        raise HTTPException(status_code=400, detail="Category name already exists.")
     doc = category.dict()
-    result = await exam_categories_collection.insert_one(doc)
+    # Duplicate names (case-insensitive) are rejected by the collated unique index on `name`
+    await check_category_name_free(doc["name"])
+    try:
+        result = await exam_categories_collection.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Category name already exists.")
     doc["id"] = str(result.inserted_id)
     return ExamCategoryOut(**doc)
 
@@ -229,18 +372,22 @@ async def update_exam_category(
     update: ExamCategoryUpdate,
     admin: dict = Depends(require_roles(ADMIN_ROLE))
 ):
-    update_dict = {k: v for k, v in update.model_dump().items() if v is not None}
+    update_dict = update.model_dump(exclude_none=True, exclude_unset=True)
     if not update_dict:
         raise HTTPException(status_code=400, detail="No data provided")
-    result = await exam_categories_collection.update_one(
-        {"_id": ObjectId(category_id)},
-        {"$set": update_dict}
-    )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Category not found")
-    updated = await exam_categories_collection.find_one({"_id": ObjectId(category_id)})
+    oid = parse_object_id(category_id, "category ID")
+    if "name" in update_dict:
+        await check_category_name_free(update_dict["name"], oid)
+    try:
+        updated = await exam_categories_collection.find_one_and_update(
+            {"_id": oid},
+            {"$set": update_dict},
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Category name already exists.")
     if not updated:
-        raise HTTPException(status_code=404, detail="Category not found after update")
+        raise HTTPException(status_code=404, detail="Category not found")
     return ExamCategoryOut(
         id=str(updated["_id"]),
         name=updated["name"],
@@ -253,7 +400,7 @@ async def delete_exam_category(
     category_id: str,
     admin: dict = Depends(require_roles(ADMIN_ROLE))
 ):
-    result = await exam_categories_collection.delete_one({"_id": ObjectId(category_id)})
+    result = await exam_categories_collection.delete_one({"_id": parse_object_id(category_id, "category ID")})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
     return {"message": "Category deleted successfully"}
@@ -265,25 +412,32 @@ async def test_r2_configuration(
     admin=Depends(require_roles(ADMIN_ROLE))
 ):
     """Test endpoint to check R2 configuration"""
-    from app.storage.r2_client import R2_CONFIGURED, r2, BUCKET
-    from app.storage.s3_client import S3_CONFIGURED
-    import os
-    
+    # Build the client on demand, the same way an upload would
+    r2 = None
+    client_error = None
+    if R2_CONFIGURED:
+        try:
+            r2 = await asyncio.to_thread(r2_client.get_r2_client)
+        except Exception as e:
+            client_error = str(e)
+    BUCKET = r2_client.BUCKET
+
     config_status = {
         "r2_configured": R2_CONFIGURED,
         "r2_client_initialized": r2 is not None,
         "bucket_name": BUCKET,
-        "has_endpoint_url": bool(os.getenv("R2_ENDPOINT_URL")),
-        "has_access_key": bool(os.getenv("R2_ACCESS_KEY")),
-        "has_secret_key": bool(os.getenv("R2_SECRET_KEY")),
-        "has_bucket_name": bool(os.getenv("R2_BUCKET_NAME")),
+        "has_endpoint_url": bool(R2_ENDPOINT_URL),
+        "has_access_key": bool(R2_ACCESS_KEY),
+        "has_secret_key": bool(R2_SECRET_KEY),
+        "has_bucket_name": bool(R2_BUCKET_NAME),
     }
     
     # Test bucket access if configured
     if R2_CONFIGURED and r2 and BUCKET:
         try:
             # Try to list objects (this will test connectivity and permissions)
-            response = r2.list_objects_v2(Bucket=BUCKET, MaxKeys=1)
+            # boto3 is blocking; keep it off the event loop like the upload paths do
+            await asyncio.to_thread(r2.list_objects_v2, Bucket=BUCKET, MaxKeys=1)
             config_status["bucket_accessible"] = True
             config_status["bucket_test_error"] = None
         except Exception as e:
@@ -291,7 +445,7 @@ async def test_r2_configuration(
             config_status["bucket_test_error"] = str(e)
     else:
         config_status["bucket_accessible"] = False
-        config_status["bucket_test_error"] = "R2 not properly configured"
+        config_status["bucket_test_error"] = client_error or "R2 not properly configured"
     
     return config_status
 
@@ -321,7 +475,6 @@ async def upload_exam_file(
         raise HTTPException(status_code=400, detail="ต้องมีอย่างน้อย 1 ใน 2 (essay_count หรือ choice_count) ที่เป็น 1 ขึ้นไป")
 
     # Decide which storage backend to use
-    from app.storage.s3_client import upload_to_s3, S3_CONFIGURED
     if S3_CONFIGURED:
         file_url = await upload_to_s3(file)
     elif R2_CONFIGURED:
@@ -342,6 +495,7 @@ async def upload_exam_file(
         "tags": tags_list,  # Store category IDs here
         "essay_count": int(essay_count),
         "choice_count": int(choice_count),
+        "total_questions": int(essay_count) + int(choice_count),
         "url": file_url,
         "uploaded_by": current_user["email"],
         "created_at": datetime.utcnow(),
@@ -349,6 +503,7 @@ async def upload_exam_file(
         "answer_key": answer_key_data
     }
     result = await exam_files_collection.insert_one(record)
+    await bump_exams_version()
     record["id"] = str(result.inserted_id)
     record["url"] = file_url
     return ExamFileOut(**{**record, "id": str(result.inserted_id)})
@@ -359,20 +514,32 @@ async def update_exam_file(
     update_data: ExamFileUpdate,
     admin=Depends(require_roles(ADMIN_ROLE))
 ):
-    update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
+    update_dict = update_data.model_dump(exclude_none=True, exclude_unset=True)
     if not update_dict:
         raise HTTPException(status_code=400, detail="No data provided")
     update_dict["updated_at"] = datetime.utcnow()
+    oid = parse_object_id(file_id, "file ID")
     try:
-        result = await exam_files_collection.update_one(
-            {"_id": ObjectId(file_id)},
-            {"$set": update_dict}
+        # Pipeline update: set the edited fields, then recompute total_questions from
+        # the stored counts (either one may be missing from a partial edit)
+        updated = await exam_files_collection.find_one_and_update(
+            {"_id": oid},
+            [
+                {"$set": {field: {"$literal": value} for field, value in update_dict.items()}},
+                {"$set": {"total_questions": {"$add": [{"$ifNull": ["$essay_count", 0]}, {"$ifNull": ["$choice_count", 0]}]}}},
+            ],
+            projection=EXAM_FILE_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
-        if result.matched_count == 0:
-            raise HTTPException(status_code=404, detail="File not found")
-        updated = await exam_files_collection.find_one({"_id": ObjectId(file_id)})
-        if not updated:
-            raise HTTPException(status_code=404, detail="File not found after update")
+    except Exception as e:
+        # Log the actual error for debugging
+        print(f"Update error: {type(e).__name__}: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to update exam file: {str(e)}")
+    if not updated:
+        raise HTTPException(status_code=404, detail="File not found")
+    await bump_exams_version()
+    try:
         return ExamFileOut(
             id=str(updated["_id"]),
             title=updated["title"],
@@ -386,102 +553,86 @@ async def update_exam_file(
     except ValueError as ve:
         # Validation errors from the model
         raise HTTPException(status_code=422, detail=str(ve))
-    except Exception as e:
-        if "invalid" in str(e).lower():
-            raise HTTPException(status_code=400, detail="Invalid file ID format")
-        # Log the actual error for debugging
-        print(f"Update error: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Failed to update exam file: {str(e)}")
 
-@router.get("/exam-files", response_model=List[ExamFileOut])
+@router.get("/exam-files", response_model=ExamFilePage)
 async def list_exam_files(
     admin: dict = Depends(require_roles(ADMIN_ROLE)),
-    page: int = Query(1, ge=1, description="Page number"),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
     limit: int = Query(10, ge=1, le=100, description="Items per page")
 ):
-    skip = (page - 1) * limit
-    files = []
-    async for file_doc in exam_files_collection.find().skip(skip).limit(limit):
-        files.append(ExamFileOut(
-            id=str(file_doc["_id"]),
-            title=file_doc["title"],
-            description=file_doc["description"],
-            tags=file_doc.get("tags", []),
-            url=file_doc["url"],
-            uploaded_by=file_doc["uploaded_by"],
-            essay_count=file_doc.get("essay_count", 0),
-            choice_count=file_doc.get("choice_count", 0)
-        ))
-    return files
+    # Newest first
+    docs, next_cursor, has_more = await paginate(exam_files_collection, {}, cursor, limit, EXAM_FILE_PROJECTION, descending=True)
+    return ORJSONResponse({
+        "data": [exam_file_dict(file_doc) for file_doc in docs],
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    })
 
 @router.delete("/exam-files/{file_id}")
 async def delete_exam_file(
     file_id: str,
     admin: dict = Depends(require_roles(ADMIN_ROLE))
 ):
+    oid = parse_object_id(file_id, "file ID")
     try:
-        result = await exam_files_collection.delete_one({"_id": ObjectId(file_id)})
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="File not found")
-        return {"message": "Exam file deleted successfully"}
-    except Exception as e:
-        if "invalid" in str(e).lower():
-            raise HTTPException(status_code=400, detail="Invalid file ID format")
+        result = await exam_files_collection.delete_one({"_id": oid})
+    except Exception:
         raise HTTPException(status_code=500, detail="Failed to delete exam file")
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="File not found")
+    await bump_exams_version()
+    return {"message": "Exam file deleted successfully"}
 
-@router.get("/exam-files/by-category/{category_id}", response_model=List[ExamFileOut])
+@router.get("/exam-files/by-category/{category_id}", response_model=ExamFilePage)
 async def get_exam_files_by_category(
     category_id: str,
     admin: dict = Depends(require_roles(ADMIN_ROLE)),
-    page: int = Query(1, ge=1, description="Page number"),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
     limit: int = Query(10, ge=1, le=100, description="Items per page")
 ):
-    skip = (page - 1) * limit
-    files = []
     # Find files where category_id is in tags
-    async for file_doc in exam_files_collection.find({"tags": category_id}).skip(skip).limit(limit):
-        files.append(ExamFileOut(
-            id=str(file_doc["_id"]),
-            title=file_doc["title"],
-            description=file_doc["description"],
-            tags=file_doc.get("tags", []),
-            url=file_doc["url"],
-            uploaded_by=file_doc["uploaded_by"],
-            essay_count=file_doc.get("essay_count", 0),
-            choice_count=file_doc.get("choice_count", 0)
-        ))
-    return files
+    docs, next_cursor, has_more = await paginate(exam_files_collection, {"tags": category_id}, cursor, limit, EXAM_FILE_PROJECTION)
+    return ORJSONResponse({
+        "data": [exam_file_dict(file_doc) for file_doc in docs],
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    })
 
 @router.get("/exam-files/all", response_model=List[ExamFileOut])
 async def get_all_exam_files(admin: dict = Depends(require_roles(ADMIN_ROLE))):
-    files = []
-    async for file_doc in exam_files_collection.find():
-        files.append(ExamFileOut(
-            id=str(file_doc["_id"]),
-            title=file_doc["title"],
-            description=file_doc["description"],
-            tags=file_doc.get("tags", []),
-            url=file_doc["url"],
-            uploaded_by=file_doc["uploaded_by"],
-            essay_count=file_doc.get("essay_count", 0),
-            choice_count=file_doc.get("choice_count", 0)
-        ))
-    return files
+    docs = await exam_files_collection.find({}, EXAM_FILE_PROJECTION).to_list(length=None)
+    return ORJSONResponse([exam_file_dict(file_doc) for file_doc in docs])
 
 # === SYSTEM STATS ===
 
+ROLE_STATS_CACHE_KEY = "stats:roles"
+ROLE_STATS_CACHE_SECONDS = 30
+
+async def get_role_counts() -> dict:
+    """User counts by role, memoized briefly in Redis so polling dashboards don't re-aggregate."""
+    cached = await redis_client.get(ROLE_STATS_CACHE_KEY)
+    if cached:
+        return orjson.loads(cached)
+    # One grouped pass instead of a count per role
+    rows = await users_collection.aggregate([
+        {"$unwind": "$roles"},
+        {"$group": {"_id": "$roles", "count": {"$sum": 1}}}
+    ]).to_list(length=None)
+    user_roles_stats = {role: 0 for role in ALL_ROLES}
+    for row in rows:
+        if row["_id"] in user_roles_stats:
+            user_roles_stats[row["_id"]] = row["count"]
+    await redis_client.set(ROLE_STATS_CACHE_KEY, orjson.dumps(user_roles_stats), ex=ROLE_STATS_CACHE_SECONDS)
+    return user_roles_stats
+
 @router.get("/stats")
 async def get_system_stats(admin: dict = Depends(require_roles(ADMIN_ROLE))):
-    user_count = await users_collection.count_documents({})
-    exam_count = await exam_files_collection.count_documents({})
-    
-    # Get user counts by role
-    user_roles_stats = {}
-    for role in ALL_ROLES:
-        count = await users_collection.count_documents({"roles": role})
-        user_roles_stats[role] = count
+    # estimated_document_count reads collection metadata instead of walking an index
+    user_count, exam_count, user_roles_stats = await asyncio.gather(
+        users_collection.estimated_document_count(),
+        exam_files_collection.estimated_document_count(),
+        get_role_counts()
+    )
     
     return {
         "users": {
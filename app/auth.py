@@ -1,3 +1,5 @@
+import asyncio
+import functools
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from jose import jwt
@@ -11,6 +13,21 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+@functools.cache
+def _dummy_hash() -> str:
+    return pwd_context.hash("examtie-dummy-password")
+
+def _check_password(plain_password: str, hashed_password: str | None) -> bool:
+    if not hashed_password:
+        # Unknown user: still pay for one hash so timing doesn't reveal whether the account exists
+        pwd_context.verify(plain_password, _dummy_hash())
+        return False
+    return verify_password(plain_password, hashed_password)
+
+async def verify_password_async(plain_password: str, hashed_password: str | None) -> bool:
+    """bcrypt is deliberately slow; run it in a worker thread so logins don't stall the event loop."""
+    return await asyncio.to_thread(_check_password, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
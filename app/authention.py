@@ -1,15 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from app.database import redis_client
-from bson import json_util
 from datetime import datetime
 
 
 from app.models import UserIn, UserOut, Token
-from app.database import users_collection
-from app.auth import hash_password, verify_password, create_access_token
-from app.dependencies import get_user_by_email, get_user_by_username
-from app.settings import CACHE_EXPIRE_SECONDS
+from app.database import users_collection, user_search_fields
+from app.auth import hash_password, verify_password_async, create_access_token
+from app.dependencies import get_user_by_email, get_user_by_username, cache_user
 
 router = APIRouter(
     prefix="/auth/api/v1",
@@ -31,14 +28,13 @@ async def register(user_in: UserIn):
         "bio": "New to Examtie!",
         "profile_image": "https://jwt.io/_next/image?url=%2F_next%2Fstatic%2Fmedia%2Fjwt-flower.f20616b0.png&w=3840&q=75"
     })
+    user_data.update(user_search_fields(user_data))
 
     result = await users_collection.insert_one(user_data)
     # Cache the newly created user in Redis for quicker future logins
     user_data["_id"] = result.inserted_id
 
-    await redis_client.set(f"user:{user_data['email']}", json_util.dumps(user_data), ex=CACHE_EXPIRE_SECONDS)
-    if user_data.get("username"):
-        await redis_client.set(f"user_by_username:{user_data['username']}", json_util.dumps(user_data), ex=CACHE_EXPIRE_SECONDS)
+    await cache_user(user_data)
 
     access_token = create_access_token(
         data={"sub": user_data["email"], "roles": user_data["roles"]}
@@ -57,7 +53,7 @@ async def register(user_in: UserIn):
 @router.post("/login", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await get_user_by_email(form_data.username)
-    if not user or not verify_password(form_data.password, user.get("hashed_password", "")):
+    if not await verify_password_async(form_data.password, user.get("hashed_password") if user else None):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -71,7 +67,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 @router.post("/token", response_model=Token)
 async def login_for_access_token_standard(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await get_user_by_email(form_data.username)
-    if not user or not verify_password(form_data.password, user.get("hashed_password", "")):
+    if not await verify_password_async(form_data.password, user.get("hashed_password") if user else None):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
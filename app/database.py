@@ -1,11 +1,34 @@
+import logging
+from datetime import datetime, timezone
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, ReadPreference, UpdateOne
+from pymongo.collation import Collation
 import redis.asyncio as redis_async
-from app.settings import MONGO_URI, DATABASE_NAME, REDIS_URL
+from typing import Optional
+from app.settings import MONGO_URI, DATABASE_NAME, REDIS_URL, REDIS_MAX_CONNECTIONS, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE
 
-client = AsyncIOMotorClient(MONGO_URI)
+client = AsyncIOMotorClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    serverSelectionTimeoutMS=2000,
+    waitQueueTimeoutMS=1000,
+    compressors="zstd,zlib",  # wire compression for the list endpoints; zlib if zstd is unavailable
+)
 db = client[DATABASE_NAME]
 
-redis_client = redis_async.from_url(REDIS_URL, decode_responses=True)
+# Shared, bounded pool: connections are reused across requests, idle ones are only
+# PINGed every 30s, and callers wait for a free connection instead of erroring out.
+# Replies stay raw bytes: cached values are JSON that goes straight to orjson.
+redis_pool = redis_async.BlockingConnectionPool.from_url(
+    REDIS_URL,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=5,
+    health_check_interval=30,
+    socket_keepalive=True,
+    decode_responses=False,
+)
+redis_client = redis_async.Redis(connection_pool=redis_pool)
 
 users_collection = db.get_collection("users")
 system_settings_collection = db.get_collection("system_settings")
@@ -14,4 +37,183 @@ exam_categories_collection = db.get_collection("exam_categories")
 bookmarks_collection = db.get_collection("bookmarks")
 exam_questions_collection = db.get_collection("exam_questions")
 exam_submissions_collection = db.get_collection("exam_submissions")
-market_items_collection = db.get_collection("market_items")
\ No newline at end of file
+market_items_collection = db.get_collection("market_items")
+# Uncached public market reads (search) tolerate slight replica lag, so let them use
+# secondaries when there are any. Reads that fill Redis stay on the primary, or a lagging
+# secondary could re-cache data a write just invalidated.
+market_items_read_collection = market_items_collection.with_options(
+    read_preference=ReadPreference.SECONDARY_PREFERRED
+)
+
+logger = logging.getLogger("database")
+
+# Case-insensitive comparison (e.g. "Math" == "math") for unique names
+CASE_INSENSITIVE = Collation(locale="en", strength=2)
+
+# Names of the unique indexes ensure_indexes() actually built. A build fails if the
+# collection already holds duplicates, so handlers that rely on one to reject duplicates
+# keep an explicit check while it is missing from this set.
+CATEGORY_NAME_UNIQUE = "name_ci_unique"
+BOOKMARK_UNIQUE = "user_id_1_exam_id_1"
+ready_unique_indexes: set = set()
+
+async def ensure_indexes():
+    """Create the indexes the query paths rely on. Idempotent, safe to run on every startup.
+
+    Each collection's indexes go out in a single createIndexes command.
+    """
+    indexes = [
+        (exam_categories_collection, [
+            IndexModel([("name", 1)], unique=True, collation=CASE_INSENSITIVE, name=CATEGORY_NAME_UNIQUE),
+        ]),
+        (users_collection, [
+            # Exact lookups by login email / username (auth and the user cache)
+            IndexModel([("email", 1)]),
+            IndexModel([("username", 1)]),
+            # Equality filter + `_id` keyset sort used by the admin listings
+            IndexModel([("roles", 1), ("_id", 1)]),
+            # Admin search: anchored prefix on the lowercased copies (see user_search_fields)
+            IndexModel([("email_lc", 1)]),
+            IndexModel([("username_lc", 1)]),
+            IndexModel([("full_name_lc", 1)]),
+        ]),
+        (exam_files_collection, [
+            IndexModel([("tags", 1), ("_id", 1)]),
+            # Keyset listing of one category's exams
+            IndexModel([("category_id", 1), ("_id", 1)]),
+        ]),
+        (exam_questions_collection, [
+            IndexModel([("exam_id", 1)]),
+        ]),
+        # One bookmark per user and exam; also serves a user's bookmark list
+        (bookmarks_collection, [
+            IndexModel([("user_id", 1), ("exam_id", 1)], unique=True, name=BOOKMARK_UNIQUE),
+        ]),
+        (exam_submissions_collection, [
+            # A user's submissions for a set of exams, newest first
+            IndexModel([("user_id", 1), ("exam_id", 1), ("saved_at", -1)]),
+            # A user's drafts, most recently saved first
+            IndexModel([("user_id", 1), ("is_draft", 1), ("saved_at", -1)]),
+        ]),
+        # At most one draft per user and exam (completed submissions may repeat). Kept in its
+        # own batch so pre-existing duplicate drafts can't block the indexes above.
+        (exam_submissions_collection, [
+            IndexModel([("user_id", 1), ("exam_id", 1)], unique=True, partialFilterExpression={"is_draft": True}, name="one_draft_per_exam"),
+        ]),
+        (market_items_collection, [
+            # Market keyword search
+            IndexModel([("name", "text"), ("description", "text")], weights={"name": 5, "description": 1}, name="market_text_idx"),
+            IndexModel([("name", 1)], name="market_name_prefix"),
+            IndexModel([("description", 1)], name="market_description_prefix"),
+        ]),
+    ]
+    for collection, models in indexes:
+        unique = [model.document["name"] for model in models if model.document.get("unique")]
+        try:
+            await collection.create_indexes(models)
+            ready_unique_indexes.update(unique)
+        except Exception as exc:
+            logger.exception("Failed to create indexes on %s: %s", collection.name, exc)
+            if unique:
+                logger.error("Unique index(es) %s missing on %s; falling back to explicit duplicate checks", unique, collection.name)
+
+# One-off data backfills. Each returns how many documents it changed.
+
+def build_search_blob(name: str, description: Optional[str]) -> str:
+    """Lowercased name + description in one field, so substring search is a single regex. Newline-joined so a match can't straddle both."""
+    return f"{name}\n{description or ''}".lower()
+
+# Fields the admin user search matches. Each is also stored lowercased as `<field>_lc`, so
+# search can use a case-sensitive anchored prefix, which an index can bound (the `i` flag can't).
+USER_SEARCH_FIELDS = ("email", "username", "full_name")
+
+def user_search_fields(doc: dict) -> dict:
+    """The `<field>_lc` copies for whichever search fields *doc* sets; merge into every user write."""
+    return {f"{field}_lc": doc[field].lower() for field in USER_SEARCH_FIELDS if isinstance(doc.get(field), str)}
+
+async def backfill_user_search_fields(batch_size: int = 1000) -> int:
+    """Give users registered before the `<field>_lc` copies existed their values (lowercased in Python, like search)."""
+    modified = 0
+    ops = []
+    cursor = users_collection.find({"email_lc": {"$exists": False}}, {field: 1 for field in USER_SEARCH_FIELDS})
+    async for doc in cursor:
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": user_search_fields(doc)}))
+        if len(ops) >= batch_size:
+            modified += (await users_collection.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        modified += (await users_collection.bulk_write(ops, ordered=False)).modified_count
+    return modified
+
+async def backfill_market_search_blob(batch_size: int = 1000) -> int:
+    """Give market items created before `search_blob` existed their blob.
+
+    Computed in Python rather than with $toLower, which only folds ASCII and would
+    disagree with the Unicode lowercasing search applies to the keyword.
+    """
+    modified = 0
+    ops = []
+    cursor = market_items_collection.find({"search_blob": {"$exists": False}}, {"name": 1, "description": 1})
+    async for doc in cursor:
+        blob = build_search_blob(doc.get("name", ""), doc.get("description"))
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"search_blob": blob}}))
+        if len(ops) >= batch_size:
+            modified += (await market_items_collection.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        modified += (await market_items_collection.bulk_write(ops, ordered=False)).modified_count
+    return modified
+
+# A submission's non-blank answers (same rule as user._count_answered), as an aggregation expression
+ANSWERED_COUNT_EXPR = {"$size": {"$filter": {
+    "input": {"$cond": [{"$isArray": "$answers"}, "$answers", []]},
+    "cond": {"$let": {"vars": {"a": "$$this.answer"}, "in": {"$switch": {
+        "branches": [
+            {"case": {"$eq": [{"$type": "$$a"}, "string"]}, "then": {"$ne": [{"$trim": {"input": "$$a"}}, ""]}},
+            {"case": {"$eq": [{"$type": "$$a"}, "array"]}, "then": {"$gt": [{"$size": "$$a"}, 0]}},
+        ],
+        "default": {"$and": ["$$a"]},
+    }}}},
+}}}
+
+async def backfill_submission_answered_count() -> int:
+    """Give submissions saved before `answered_count` was stored their count."""
+    result = await exam_submissions_collection.update_many(
+        {"answered_count": {"$exists": False}},
+        [{"$set": {"answered_count": ANSWERED_COUNT_EXPR}}],
+    )
+    return result.modified_count
+
+async def backfill_exam_total_questions() -> int:
+    """Give exam files created before `total_questions` was stored their essay + choice count."""
+    result = await exam_files_collection.update_many(
+        {"total_questions": {"$exists": False}},
+        [{"$set": {"total_questions": {"$add": [{"$ifNull": ["$essay_count", 0]}, {"$ifNull": ["$choice_count", 0]}]}}}],
+    )
+    return result.modified_count
+
+MIGRATIONS = [
+    ("market_search_blob", backfill_market_search_blob),
+    ("exam_total_questions", backfill_exam_total_questions),
+    ("submission_answered_count", backfill_submission_answered_count),
+    ("user_search_fields", backfill_user_search_fields),
+]
+
+async def run_migrations():
+    """Run each backfill until it succeeds once, then record it in system_settings so later startups skip it.
+
+    Read paths still cope with documents written without the new fields (e.g. by old
+    workers during a rolling deploy), so a backfill only has to catch up the history.
+    """
+    for name, migration in MIGRATIONS:
+        marker = {"_id": f"migration:{name}"}
+        try:
+            if await system_settings_collection.find_one(marker, {"_id": 1}):
+                continue
+            modified = await migration()
+            await system_settings_collection.update_one(
+                marker, {"$set": {"completed_at": datetime.now(timezone.utc), "modified": modified}}, upsert=True
+            )
+            logger.info("Migration %s updated %d documents", name, modified)
+        except Exception as exc:
+            logger.exception("Migration %s failed: %s", name, exc)
@@ -3,46 +3,143 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from app.settings import SECRET_KEY, ALGORITHM, CACHE_EXPIRE_SECONDS
 from app.database import redis_client
-from bson import json_util
+from bson import ObjectId
+import asyncio
+import hashlib
+import logging
+import orjson
+import time
 from app.models import TokenData
 from app.database import users_collection
 
+logger = logging.getLogger("auth")
+
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="/api/token",
     scheme_name="Bearer Token",
     description="Enter your JWT token here"
 )
 
-async def _cache_user(user: dict):
-    """Helper – store user doc in Redis under both email and username keys."""
+def _encode_user(user: dict) -> bytes:
+    # ObjectId -> str explicitly; naive datetimes are stored as UTC
+    return orjson.dumps({**user, "_id": str(user["_id"])}, default=str, option=orjson.OPT_NAIVE_UTC)
+
+def _decode_user(cached):
+    user = orjson.loads(cached)
+    if not isinstance(user.get("_id"), str):
+        return None  # entry written in the old json_util format; treat as a miss
+    user["_id"] = ObjectId(user["_id"])
+    return user
+
+async def cache_user(user: dict):
+    """Helper – store user doc in Redis under both email and username keys in one round-trip."""
     if not user:
         return
-    # BSON -> JSON string that preserves ObjectId
-    encoded = json_util.dumps(user)
-    await redis_client.set(f"user:{user['email']}", encoded, ex=CACHE_EXPIRE_SECONDS)
-    username = user.get("username")
-    if username:
-        await redis_client.set(f"user_by_username:{username}", encoded, ex=CACHE_EXPIRE_SECONDS)
+    encoded = _encode_user(user)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.set(f"user:{user['email']}", encoded, ex=CACHE_EXPIRE_SECONDS)
+        username = user.get("username")
+        if username:
+            pipe.set(f"user_by_username:{username}", encoded, ex=CACHE_EXPIRE_SECONDS)
+        await pipe.execute()
+
+async def invalidate_cached_users(users):
+    """Helper – drop cached docs for the given users (need `email`/`username`) in one round-trip.
+
+    Runs after the Mongo write, which may well have committed, so a Redis failure is logged
+    rather than raised: a 500 would report a landed change as failed. Entries that survive
+    expire within CACHE_EXPIRE_SECONDS.
+    """
+    keys = []
+    for user in users:
+        keys.append(f"user:{user['email']}")
+        if user.get("username"):
+            keys.append(f"user_by_username:{user['username']}")
+    if not keys:
+        return
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.delete(key)
+            await pipe.execute()
+    except Exception as exc:
+        logger.error("Failed to invalidate %d cached user key(s): %s", len(keys), exc)
+
+# Exam listing pages are cached under the current catalog version. Any exam-file write
+# bumps it, orphaning every cached page at once (they then age out via their TTL).
+EXAMS_VERSION_KEY = "exams:version"
+
+async def exams_cache_version() -> int:
+    return int(await redis_client.get(EXAMS_VERSION_KEY) or 0)
+
+async def bump_exams_version():
+    await redis_client.incr(EXAMS_VERSION_KEY)
+
+# Cache key -> pending Mongo lookup, so concurrent misses for one user share a single query
+_inflight: dict[str, asyncio.Future] = {}
+
+async def _load_user(key: str, query: dict):
+    """Helper – read a user from Mongo and re-cache it, coalescing concurrent callers."""
+    fut = _inflight.get(key)
+    if fut is not None:
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            if not fut.cancelled():
+                raise  # this caller was cancelled, not the leader
+            # The leading request was cancelled before finishing; redo the lookup
+            return await _load_user(key, query)
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
+    try:
+        user = await users_collection.find_one(query)
+        if user:
+            await cache_user(user)
+        fut.set_result(user)
+        return user
+    except Exception as exc:
+        fut.set_exception(exc)
+        fut.exception()  # waiters re-raise it; don't log it as unretrieved
+        raise
+    finally:
+        if not fut.done():
+            fut.cancel()
+        _inflight.pop(key, None)
 
 async def get_user_by_email(email: str):
     key = f"user:{email}"
     cached = await redis_client.get(key)
-    if cached:
-        return json_util.loads(cached)
-    user = await users_collection.find_one({"email": email})
+    user = _decode_user(cached) if cached else None
     if user:
-        await _cache_user(user)
-    return user
+        return user
+    return await _load_user(key, {"email": email})
 
 async def get_user_by_username(username: str):
     key = f"user_by_username:{username}"
     cached = await redis_client.get(key)
-    if cached:
-        return json_util.loads(cached)
-    user = await users_collection.find_one({"username": username})
+    user = _decode_user(cached) if cached else None
     if user:
-        await _cache_user(user)
-    return user
+        return user
+    return await _load_user(key, {"username": username})
+
+async def _decode_token(token: str) -> dict:
+    """Return the token's claims, verifying the signature only on a Redis miss.
+
+    Decoded claims are cached under a hash of the token until it expires
+    (capped at CACHE_EXPIRE_SECONDS). Raises JWTError for invalid tokens.
+    """
+    key = f"jwt:{hashlib.blake2b(token.encode(), digest_size=16).hexdigest()}"
+    cached = await redis_client.get(key)
+    if cached:
+        return orjson.loads(cached)
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    claims = {"sub": payload.get("sub"), "roles": payload.get("roles", [])}
+    ttl = CACHE_EXPIRE_SECONDS
+    if payload.get("exp") is not None:
+        ttl = min(ttl, int(payload["exp"] - time.time()))
+    if claims["sub"] is not None and ttl > 0:
+        await redis_client.set(key, orjson.dumps(claims), ex=ttl)
+    return claims
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     
@@ -52,7 +149,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = await _decode_token(token)
         email = payload.get("sub")
         roles = payload.get("roles", [])
         if email is None:
@@ -69,9 +166,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     return user
 
 def require_roles(*roles: str):
+    role_set = frozenset(roles)  # built once per route, not per request
+
     async def checker(current_user: dict = Depends(get_current_user)):
-        user_roles = current_user.get("roles", [])
-        if not any(role in user_roles for role in roles):
+        if role_set.isdisjoint(current_user.get("roles", ())):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Operation not permitted"
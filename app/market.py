@@ -1,21 +1,31 @@
 from fastapi import APIRouter, Query, HTTPException, status, Depends
-from typing import List, Optional
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import TypeAdapter
+from typing import List, Optional, Literal
 from bson import ObjectId
+from bson.regex import Regex
+import functools
+import orjson
+import re
 
-from app.database import market_items_collection
+from app.database import market_items_collection, market_items_read_collection, redis_client, build_search_blob
 from app.models import MarketItemOut, MarketItemCreate
 from app.dependencies import require_roles, get_current_user
-from app.settings import SELLER_ROLE, ADMIN_ROLE
+from app.settings import SELLER_ROLE, ADMIN_ROLE, CACHE_EXPIRE_SECONDS
 
 router = APIRouter(
     prefix="/market/api/v1",
     tags=["Market"]
 )
 
-# Helper to convert MongoDB document to Pydantic output model
+# Only the fields MarketItemOut renders
+MARKET_ITEM_PROJECTION = {"name": 1, "description": 1, "price": 1, "image_url": 1}
+
+# Helper to convert MongoDB document to Pydantic output model.
+# Documents come from our own collection, so validation is skipped.
 
 def to_market_item_out(doc) -> MarketItemOut:
-    return MarketItemOut(
+    return MarketItemOut.model_construct(
         id=str(doc["_id"]),
         name=doc["name"],
         description=doc.get("description"),
@@ -23,46 +33,103 @@ def to_market_item_out(doc) -> MarketItemOut:
         image_url=doc.get("image_url"),
     )
 
+# Dumps a whole list of items in one call instead of model by model
+_MARKET_ITEM_LIST = TypeAdapter(List[MarketItemOut])
+
+def dump_market_items(docs) -> list:
+    return _MARKET_ITEM_LIST.dump_python([to_market_item_out(doc) for doc in docs], mode="json")
+
+@functools.lru_cache(maxsize=512)
+def build_prefix_query(keyword: str) -> dict:
+    """Anchored, case-sensitive prefix filter (index-friendly). Memoized for frequent keywords; treat as read-only."""
+    prefix = Regex(f"^{re.escape(keyword)}")
+    return {"$or": [{"name": prefix}, {"description": prefix}]}
+
+_OID_RE = re.compile(r"[0-9a-fA-F]{24}")
+
+def parse_item_id(item_id: str) -> ObjectId:
+    """Shape-check the id before building an ObjectId, so bad input never raises inside bson."""
+    if not _OID_RE.fullmatch(item_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid item ID format")
+    return ObjectId(item_id)
+
+# Cache-aside for the read endpoints; writes drop the affected keys
+ITEMS_CACHE_PREFIX = "market:items:"
+
+def item_cache_key(oid: ObjectId) -> str:
+    # From the parsed id, so upper/lower-case hex in the path share one key
+    return f"market:item:{oid}"
+
+async def delete_cache_pattern(pattern: str):
+    """Delete every key matching *pattern*, walking with SCAN rather than blocking on KEYS."""
+    keys = [key async for key in redis_client.scan_iter(match=pattern, count=500)]
+    if keys:
+        await redis_client.delete(*keys)
+
 # ----------------------- PUBLIC ROUTES -----------------------
 
 @router.get("/items", response_model=List[MarketItemOut])
 async def list_market_items(q: int = Query(10, ge=1, le=100, description="Number of items to retrieve"),current_user: dict = Depends(get_current_user)):
     """Get *q* items from the market (default 10, max 100)."""
-    items: List[MarketItemOut] = []
-    async for doc in market_items_collection.find().limit(q):
-        items.append(to_market_item_out(doc))
-    return items
+    cache_key = f"{ITEMS_CACHE_PREFIX}q={q}"
+    cached = await redis_client.get(cache_key)
+    if cached:
+        return Response(content=cached, media_type="application/json")
+    docs = await market_items_collection.find({}, MARKET_ITEM_PROJECTION).limit(q).to_list(length=q)
+    items = dump_market_items(docs)
+    await redis_client.set(cache_key, orjson.dumps(items), ex=CACHE_EXPIRE_SECONDS)
+    return ORJSONResponse(items)
 
 @router.get("/items/search", response_model=List[MarketItemOut])
 async def search_market_items(
     keyword: str = Query(..., min_length=1, description="Keyword to search for"),
     limit: int = Query(20, ge=1, le=100, description="Max items to return"),
+    match: Literal["text", "prefix", "substring"] = Query("text", description="`text`: whole-word search; `prefix`: name/description starts with keyword; `substring`: keyword appears verbatim"),
     current_user: dict = Depends(get_current_user),
 ):
-    """Search items by **name** or **description**."""
-    query = {
-        "$or": [
-            {"name": {"$regex": keyword, "$options": "i"}},
-            {"description": {"$regex": keyword, "$options": "i"}},
+    """Search items by **name** or **description**.
+
+    * `text` (default) uses the `market_text_idx` text index: matches whole (stemmed)
+      words, best matches first, with name hits weighted above description hits.
+    * `prefix` is for partial words. It is an anchored, case-sensitive regex so the
+      plain `name`/`description` indexes can bound the scan ($regex ignores collation,
+      and an `i` flag would force every index key to be tested).
+    * `substring` narrows candidates with the text index first, then runs one regex
+      over the hits' lowercased `search_blob` (name + description) instead of an
+      `$or` of case-insensitive regexes on each field.
+    """
+    if match == "substring":
+        pipeline = [
+            {"$match": {"$text": {"$search": keyword}}},
+            {"$match": {"search_blob": {"$regex": re.escape(keyword.lower())}}},
+            {"$limit": limit},
+            {"$project": MARKET_ITEM_PROJECTION},
         ]
-    }
-    items: List[MarketItemOut] = []
-    async for doc in market_items_collection.find(query).limit(limit):
-        items.append(to_market_item_out(doc))
-    return items
+        cursor = market_items_read_collection.aggregate(pipeline)
+    elif match == "prefix":
+        cursor = market_items_read_collection.find(build_prefix_query(keyword), MARKET_ITEM_PROJECTION).limit(limit)
+    else:
+        query = {"$text": {"$search": keyword}}
+        projection = {**MARKET_ITEM_PROJECTION, "score": {"$meta": "textScore"}}
+        cursor = market_items_read_collection.find(query, projection).sort([("score", {"$meta": "textScore"})]).limit(limit)
+    docs = await cursor.to_list(length=limit)
+    return ORJSONResponse(dump_market_items(docs))
 
 @router.get("/items/{item_id}", response_model=MarketItemOut)
 async def get_market_item(item_id: str, current_user: dict = Depends(get_current_user)):
     """Retrieve a single market item by its *id*."""
-    try:
-        oid = ObjectId(item_id)
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid item ID format")
+    oid = parse_item_id(item_id)
 
-    doc = await market_items_collection.find_one({"_id": oid})
+    cache_key = item_cache_key(oid)
+    cached = await redis_client.get(cache_key)
+    if cached:
+        return orjson.loads(cached)
+    doc = await market_items_collection.find_one({"_id": oid}, MARKET_ITEM_PROJECTION)
     if not doc:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
-    return to_market_item_out(doc)
+    item = to_market_item_out(doc)
+    await redis_client.set(cache_key, orjson.dumps(item.model_dump()), ex=CACHE_EXPIRE_SECONDS)
+    return item
 
 # ----------------------- ADMIN/SELLER ROUTES -----------------------
 
@@ -73,9 +140,11 @@ async def create_market_item(
 ):
     """Create a new market item (admin/seller only)."""
     doc = item.model_dump()
+    doc["search_blob"] = build_search_blob(doc["name"], doc.get("description"))
     result = await market_items_collection.insert_one(doc)
-    created = await market_items_collection.find_one({"_id": result.inserted_id})
-    return to_market_item_out(created)
+    doc["_id"] = result.inserted_id  # we already hold the full document; no need to read it back
+    await delete_cache_pattern(f"{ITEMS_CACHE_PREFIX}*")
+    return to_market_item_out(doc)
 
 @router.delete("/items/{item_id}")
 async def delete_market_item(
@@ -83,11 +152,10 @@ async def delete_market_item(
     current_user: dict = Depends(require_roles(ADMIN_ROLE, SELLER_ROLE)),
 ):
     """Delete a market item (admin/seller only)."""
-    try:
-        oid = ObjectId(item_id)
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid item ID format")
+    oid = parse_item_id(item_id)
     result = await market_items_collection.delete_one({"_id": oid})
     if result.deleted_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+    await redis_client.delete(item_cache_key(oid))
+    await delete_cache_pattern(f"{ITEMS_CACHE_PREFIX}*")
     return {"message": "Item deleted successfully"}
@@ -1,5 +1,5 @@
 from typing import List, Optional, Literal, Union
-from pydantic import BaseModel, EmailStr, Field, field_validator, root_validator, model_validator
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
 from datetime import datetime
 
 from app.settings import ALL_ROLES
@@ -121,6 +121,16 @@ class AdminUserOut(BaseModel):
     profile_image: Optional[str] = ""
     created_at: Optional[datetime] = None
 
+class AdminUserPage(BaseModel):
+    data: List[AdminUserOut]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+class ExamFilePage(BaseModel):
+    data: List[ExamFileOut]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
 class UpdateUserRole(BaseModel):
     role: Literal["user", "admin", "staff", "seller"]
     
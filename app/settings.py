@@ -6,12 +6,15 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "myapp")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 200))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 20))  # kept open so early requests skip the handshake
 
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
 REDIS_DB = os.getenv("REDIS_DB", "0")
 # Redis connection URL. If REDIS_URL is not provided, default to a local instance.
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 CACHE_EXPIRE_SECONDS = int(os.getenv("CACHE_EXPIRE_SECONDS", 3600))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
 
 SECRET_KEY = os.getenv("SECRET_KEY", "niga56")
 ALGORITHM = "HS256"
@@ -19,6 +22,20 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES_SECONDS
 
 STREAK_TTL_SECONDS = int(os.getenv("STREAK_TTL_SECONDS", 60 * 60 * 24 * 60))  # 60 days default
 
+# Object storage: S3/MinIO is preferred, Cloudflare R2 is the fallback
+S3_ENDPOINT = os.getenv("S3_ENDPOINT")  # e.g. http://minio:9766
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
+STORAGE_BUCKET = os.getenv("STORAGE_BUCKET") or os.getenv("STORAGE_BUCKET_NAME", "examtie")
+STORAGE_REGION = os.getenv("STORAGE_REGION", "us-east-1")
+PUBLIC_STORAGE_URL = os.getenv("PUBLIC_STORAGE_URL")  # optional—frontend public proxy path
+
+R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
+R2_ACCESS_KEY = os.getenv("R2_ACCESS_KEY")
+R2_SECRET_KEY = os.getenv("R2_SECRET_KEY")
+R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
+R2_REGION = os.getenv("R2_REGION", "auto")
+
 ADMIN_ROLE = "admin"
 USER_ROLE = "user"
 STAFF_ROLE = "staff"
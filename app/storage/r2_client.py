@@ -1,70 +1,79 @@
+import asyncio
+import functools
 import boto3
-import os
-import re
-from dotenv import load_dotenv
 import uuid
 from fastapi import UploadFile, HTTPException
 
-# Load environment variables from the Backend directory
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
+from app.storage.transfer import TRANSFER_CONFIG, upload_with_bucket_retry
+from app.settings import (
+    R2_ENDPOINT_URL,
+    R2_ACCESS_KEY,
+    R2_SECRET_KEY,
+    R2_BUCKET_NAME,
+    R2_REGION,
+    PUBLIC_STORAGE_URL,
+)
 
 # Check if R2 is configured
-R2_CONFIGURED = bool(
-    os.getenv("R2_ACCESS_KEY") and 
-    os.getenv("R2_SECRET_KEY") and 
-    os.getenv("R2_BUCKET_NAME") and
-    os.getenv("R2_ENDPOINT_URL")
-)
+R2_CONFIGURED = bool(R2_ACCESS_KEY and R2_SECRET_KEY and R2_BUCKET_NAME and R2_ENDPOINT_URL)
 
-s3_endpoint = os.getenv("R2_ENDPOINT_URL")
+s3_endpoint = R2_ENDPOINT_URL
 
-if R2_CONFIGURED:
-    s3_endpoint = os.getenv("R2_ENDPOINT_URL")
-    account_id = os.getenv("R2_ACCOUNT_ID")
-    
-    try:
+# The client is built by init_r2() from the app lifespan (or lazily on first use),
+# never at import, so a startup hiccup doesn't leave R2 disabled for the process
+r2 = None
+BUCKET = R2_BUCKET_NAME if R2_CONFIGURED else None
+S3_ENDPOINT = s3_endpoint if R2_CONFIGURED else None
+
+# Bucket existence is checked once at startup (or on the first upload), not per upload
+_bucket_ready = False
+
+def get_r2_client():
+    """Create (or return existing) boto3 client for R2. Raises on failure."""
+    global r2
+    if r2 is None:
         r2 = boto3.client(
             "s3",
-            region_name=os.getenv("R2_REGION", "auto"),
+            region_name=R2_REGION,
             endpoint_url=s3_endpoint,
-            aws_access_key_id=os.getenv("R2_ACCESS_KEY"),
-            aws_secret_access_key=os.getenv("R2_SECRET_KEY"),
+            aws_access_key_id=R2_ACCESS_KEY,
+            aws_secret_access_key=R2_SECRET_KEY,
         )
-        BUCKET = os.getenv("R2_BUCKET_NAME")
-        
-        # Ensure bucket exists
-        existing_buckets = r2.list_buckets().get("Buckets", [])
-        if not any(b["Name"] == BUCKET for b in existing_buckets):
-            try:
-                r2.create_bucket(Bucket=BUCKET)
-                print(f"Created bucket '{BUCKET}' in local S3 store")
-            except Exception as create_exc:
-                print(f"Failed to create bucket '{BUCKET}': {create_exc}")
-        
-        S3_ENDPOINT = s3_endpoint
-        
+    return r2
+
+def _ensure_bucket():
+    global _bucket_ready
+    client = get_r2_client()
+    try:
+        client.head_bucket(Bucket=BUCKET)
+    except Exception:
+        try:
+            client.create_bucket(Bucket=BUCKET)
+            print(f"Created bucket '{BUCKET}' in local S3 store")
+        except Exception as create_exc:
+            print(f"Failed to create bucket '{BUCKET}': {create_exc}")
+    _bucket_ready = True
+
+def init_r2():
+    """Build the R2 client and check the bucket. Blocking; run it in a thread at startup."""
+    if not R2_CONFIGURED:
+        print("R2 not configured - missing required environment variables")
+        return
+    try:
+        _ensure_bucket()
         print(f"R2 Configuration initialized:")
-        
     except Exception as e:
+        # Leave it to the first upload to retry
         print(f"Error initializing R2 client: {e}")
-        r2 = None
-        BUCKET = None
-        PUBLIC_ENDPOINT = None
-        S3_ENDPOINT = None
-        R2_CONFIGURED = False
-else:
-    r2 = None
-    BUCKET = None
-    PUBLIC_ENDPOINT = None
-    S3_ENDPOINT = None
-    print("R2 not configured - missing required environment variables")
 
 async def upload_to_r2(file: UploadFile) -> str:
     if not R2_CONFIGURED:
         raise HTTPException(status_code=500, detail="R2 storage is not configured.")
     
-    if not r2 or not BUCKET:
-        raise HTTPException(status_code=500, detail="R2 client is not properly initialized")
+    try:
+        client = get_r2_client()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"R2 client is not properly initialized: {e}")
     
     # Validate file
     if not file or not file.filename:
@@ -76,17 +85,21 @@ async def upload_to_r2(file: UploadFile) -> str:
         
         file_id = f"{uuid.uuid4()}_{file.filename}"
         
-        # Upload file to R2
-        r2.upload_fileobj(
+        # Upload file to R2 (boto3 is blocking; keep it off the event loop)
+        if not _bucket_ready:
+            await asyncio.to_thread(_ensure_bucket)
+        upload = functools.partial(
+            client.upload_fileobj,
             file.file,
             BUCKET,
             file_id,
-            ExtraArgs={"ACL": "public-read"}  # Make file public
+            ExtraArgs={"ACL": "public-read"},  # Make file public
+            Config=TRANSFER_CONFIG
         )
+        await upload_with_bucket_retry(upload, _ensure_bucket, file)
         
-        public_base = os.getenv("PUBLIC_STORAGE_URL")
-        if public_base:
-            public_base = public_base.rstrip("/")
+        if PUBLIC_STORAGE_URL:
+            public_base = PUBLIC_STORAGE_URL.rstrip("/")
             return f"{public_base}/{BUCKET}/{file_id}"
         # Fallback to original endpoint (may be internal)
         return f"{s3_endpoint}/{file_id}"
@@ -1,27 +1,27 @@
-import os
+import asyncio
+import functools
 import uuid
 
-from dotenv import load_dotenv
 from fastapi import UploadFile, HTTPException
 import boto3
 
-# Load environment variables from the Backend directory (two levels up)
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
-
-# === Configuration ===
-S3_ENDPOINT = os.getenv("S3_ENDPOINT")  # e.g. http://minio:9766
-S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
-S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
-STORAGE_BUCKET = os.getenv("STORAGE_BUCKET") or os.getenv("STORAGE_BUCKET_NAME") or os.getenv("STORAGE_BUCKET_NAME", "examtie")
-STORAGE_REGION = os.getenv("STORAGE_REGION", "us-east-1")
-PUBLIC_STORAGE_URL = os.getenv("PUBLIC_STORAGE_URL")  # optional—frontend public proxy path
+from app.storage.transfer import TRANSFER_CONFIG, upload_with_bucket_retry
+from app.settings import (
+    S3_ENDPOINT,
+    S3_ACCESS_KEY,
+    S3_SECRET_KEY,
+    STORAGE_BUCKET,
+    STORAGE_REGION,
+    PUBLIC_STORAGE_URL,
+)
 
 S3_CONFIGURED = bool(S3_ENDPOINT and S3_ACCESS_KEY and S3_SECRET_KEY and STORAGE_BUCKET)
 
-# The boto3 client will be created lazily so that a temporary connectivity issue
-# (or running outside Docker where `minio` DNS is unknown) doesn’t permanently
-# disable the storage backend during module import.
+# The boto3 client is created by init_s3() from the app lifespan (or lazily on the
+# first upload), never at import, so a temporary connectivity issue (or running
+# outside Docker where `minio` DNS is unknown) doesn’t disable the storage backend.
 _s3_client = None
+_bucket_ready = False
 
 def _get_client():
     """Create (or return existing) boto3 client. Raises on failure."""
@@ -36,6 +36,29 @@ def _get_client():
         )
     return _s3_client
 
+def _ensure_bucket(s3):
+    """Make sure the bucket exists. Runs once per process (and again only if an upload reports it missing)."""
+    global _bucket_ready
+    try:
+        s3.head_bucket(Bucket=STORAGE_BUCKET)
+    except Exception:
+        try:
+            s3.create_bucket(Bucket=STORAGE_BUCKET)
+        except Exception:
+            pass  # bucket likely already exists or we lack perms; proceed anyway
+    _bucket_ready = True
+
+
+def init_s3():
+    """Build the client and check the bucket once at startup. Blocking; run it in a thread."""
+    if not S3_CONFIGURED:
+        return
+    try:
+        _ensure_bucket(_get_client())
+        print("S3 Configuration initialized:")
+    except Exception as e:
+        # Leave it to the first upload to retry
+        print(f"Error initializing S3 client: {e}")
 
 
 async def upload_to_s3(file: UploadFile) -> str:
@@ -52,21 +75,19 @@ async def upload_to_s3(file: UploadFile) -> str:
         await file.seek(0)  # make sure we read from the start
         object_key = f"{uuid.uuid4()}_{file.filename}"
 
-        # Ensure bucket exists (do this lazily once)
-        try:
-            s3.head_bucket(Bucket=STORAGE_BUCKET)
-        except Exception:
-            try:
-                s3.create_bucket(Bucket=STORAGE_BUCKET)
-            except Exception:
-                pass  # bucket likely already exists or we lack perms; proceed anyway
+        # boto3 is blocking; run its calls in a worker thread so the event loop keeps serving
+        if not _bucket_ready:
+            await asyncio.to_thread(_ensure_bucket, s3)
 
-        s3.upload_fileobj(
+        upload = functools.partial(
+            s3.upload_fileobj,
             file.file,
             STORAGE_BUCKET,
             object_key,
             ExtraArgs={"ACL": "public-read"},
+            Config=TRANSFER_CONFIG,
         )
+        await upload_with_bucket_retry(upload, functools.partial(_ensure_bucket, s3), file)
 
         # Compose public URL – if PUBLIC_STORAGE_URL provided, use that, else fall back to direct endpoint
         if PUBLIC_STORAGE_URL:
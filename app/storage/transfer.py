@@ -0,0 +1,25 @@
+import asyncio
+
+from boto3.s3.transfer import TransferConfig
+
+# Stream the upload's spooled temp file in 8 MB multipart chunks instead of one big PUT;
+# built once and reused by every upload. Parts go up in parallel on up to 8 threads.
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True,
+)
+
+
+async def upload_with_bucket_retry(upload, ensure_bucket, file):
+    """Run the blocking `upload` in a worker thread; if the bucket is gone, recreate it and retry once."""
+    try:
+        await asyncio.to_thread(upload)
+    except Exception as exc:
+        if "NoSuchBucket" not in str(exc):
+            raise
+        # Bucket disappeared since we checked; recreate it and retry once
+        await asyncio.to_thread(ensure_bucket)
+        await file.seek(0)
+        await asyncio.to_thread(upload)
@@ -1,21 +1,31 @@
 from fastapi import APIRouter, Depends, Query, Body, HTTPException
+from fastapi.responses import Response
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from app.models import *
-from app.database import users_collection, exam_files_collection, bookmarks_collection, exam_questions_collection, exam_submissions_collection, exam_categories_collection, redis_client
-from app.dependencies import get_current_user, require_roles, get_user_by_email
-from typing import List, Any
+from app.database import users_collection, exam_files_collection, bookmarks_collection, exam_questions_collection, exam_submissions_collection, exam_categories_collection, redis_client, ANSWERED_COUNT_EXPR, ready_unique_indexes, BOOKMARK_UNIQUE, user_search_fields
+from app.dependencies import get_current_user, require_roles, cache_user, exams_cache_version
+from typing import List, Any, Optional
 from pydantic import BaseModel
-from datetime import date, timedelta
-import redis.asyncio as redis_async
-from datetime import datetime
-from bson import json_util
+from datetime import date, datetime, timedelta, timezone
 from app.settings import ALL_ROLES, CACHE_EXPIRE_SECONDS, STREAK_TTL_SECONDS
+import asyncio
+import functools
+import orjson
+import re
+import time
 
 router = APIRouter(
     prefix="/user/api/v1",
     tags=["User"]
 )
 
+# Only the fields each response actually renders
+EXAM_FILE_PROJECTION = {"title": 1, "description": 1, "tags": 1, "url": 1, "uploaded_by": 1, "essay_count": 1, "choice_count": 1, "total_questions": 1}
+EXAM_CATEGORY_PROJECTION = {"name": 1, "description": 1, "english_name": 1}
+BOOKMARK_PROJECTION = {"user_id": 1, "exam_id": 1, "created_at": 1}
+
 @router.get("/@me", response_model=MeReturn)
 async def read_users_me(current_user: dict = Depends(get_current_user)):
     return MeReturn(
@@ -28,28 +38,31 @@ async def read_users_me(current_user: dict = Depends(get_current_user)):
         profile_image=current_user.get("profile_image", "")
     )
 
+def me_return(user: dict) -> MeReturn:
+    return MeReturn(
+        id=str(user["_id"]),
+        email=user["email"],
+        username=user["username"],
+        full_name=user.get("full_name", ""),
+        roles=user.get("roles", []),
+        bio=user.get("bio", ""),
+        profile_image=user.get("profile_image", "")
+    )
+
 @router.put("/@me", response_model=MeReturn)
 async def update_profile(update: UpdateProfile, current_user: dict = Depends(get_current_user)):
-    update_data = {k: v for k, v in update.model_dump().items() if v is not None}
-    if update_data:
-        await users_collection.update_one({"_id": current_user["_id"]}, {"$set": update_data})
-        updated_copy = current_user.copy()
-        updated_copy.update(update_data)
-        await redis_client.set(f"user:{current_user['email']}", json_util.dumps(updated_copy), ex=3600)
-        if updated_copy.get("username"):
-            await redis_client.set(f"user_by_username:{updated_copy['username']}", json_util.dumps(updated_copy), ex=3600)
-    updated_user = await get_user_by_email(current_user["email"])
-    if not updated_user:
+    update_data = update.model_dump(exclude_none=True, exclude_unset=True)
+    if not update_data:
+        # Nothing to change; current_user is already the up-to-date profile
+        return me_return(current_user)
+    update_data.update(user_search_fields(update_data))
+    result = await users_collection.update_one({"_id": current_user["_id"]}, {"$set": update_data})
+    if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
-    return MeReturn(
-        id=str(updated_user["_id"]),
-        email=updated_user["email"],
-        username=updated_user["username"],
-        full_name=updated_user.get("full_name", ""),
-        roles=updated_user.get("roles", []),
-        bio=updated_user.get("bio", ""),
-        profile_image=updated_user.get("profile_image", "")
-    )
+    updated_copy = current_user.copy()
+    updated_copy.update(update_data)
+    await cache_user(updated_copy)
+    return me_return(updated_copy)
 
 
 @router.get("/dashboard")
@@ -59,14 +72,25 @@ async def dashboard(user: dict = Depends(require_roles("user"))):
         "roles": user.get("roles", [])
     }
 
-@router.get("/exams", response_model=List[ExamFileOut])
-async def user_list_exams(
-    page: int = Query(1, ge=1, description="Page number"),
-    limit: int = Query(10, ge=1, le=100, description="Items per page")
-):
-    skip = (page - 1) * limit
+async def exam_files_page(category_id: Optional[str], after_id: Optional[str], limit: int):
+    """Keyset page over exam files in `_id` order: seek past *after_id* instead of skipping.
+
+    Fetches one extra document to know whether another page exists. Pages are cached
+    under the catalog version, which admin exam-file writes bump.
+    """
+    query = {"category_id": category_id} if category_id else {}
+    if after_id:
+        if not ObjectId.is_valid(after_id):
+            raise HTTPException(status_code=400, detail="Invalid after_id")
+        query["_id"] = {"$gt": ObjectId(after_id)}
+    cache_key = f"exams:page:v{await exams_cache_version()}:{category_id or '*'}:{after_id or ''}:{limit}"
+    cached = await redis_client.get(cache_key)
+    if cached:
+        return Response(content=cached, media_type="application/json")
+    docs = await exam_files_collection.find(query, EXAM_FILE_PROJECTION).sort("_id", 1).limit(limit + 1).to_list(length=limit + 1)
+    has_more = len(docs) > limit
     files = []
-    async for file_doc in exam_files_collection.find().skip(skip).limit(limit):
+    for file_doc in docs[:limit]:
         files.append(ExamFileOut(
             id=str(file_doc["_id"]),
             title=file_doc["title"],
@@ -77,46 +101,45 @@ async def user_list_exams(
             essay_count=file_doc.get("essay_count", 0),
             choice_count=file_doc.get("choice_count", 0)
         ))
-    return files
+    page = ExamFilePage(data=files, next_cursor=files[-1].id if has_more else None, has_more=has_more)
+    await redis_client.set(cache_key, orjson.dumps(page.model_dump()), ex=CACHE_EXPIRE_SECONDS)
+    return page
+
+@router.get("/exams", response_model=ExamFilePage)
+async def user_list_exams(
+    limit: int = Query(10, ge=1, le=100, description="Items per page"),
+    after_id: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
+    return await exam_files_page(None, after_id, limit)
 
 
 
-@router.get("/exams/by-category/{category_id}", response_model=List[ExamFileOut])
+@router.get("/exams/by-category/{category_id}", response_model=ExamFilePage)
 async def user_list_exams_by_category(
     category_id: str,
-    page: int = Query(1, ge=1, description="Page number"),
-    limit: int = Query(10, ge=1, le=100, description="Items per page")
+    limit: int = Query(10, ge=1, le=100, description="Items per page"),
+    after_id: Optional[str] = Query(None, description="next_cursor from the previous page")
 ):
-    skip = (page - 1) * limit
-    files = []
-    async for file_doc in exam_files_collection.find({"category_id": category_id}).skip(skip).limit(limit):
-        files.append(ExamFileOut(
-            id=str(file_doc["_id"]),
-            title=file_doc["title"],
-            description=file_doc["description"],
-            tags=file_doc.get("tags", []),
-            url=file_doc["url"],
-            uploaded_by=file_doc["uploaded_by"],
-            essay_count=file_doc.get("essay_count", 0),
-            choice_count=file_doc.get("choice_count", 0)
-        ))
-    return files
+    return await exam_files_page(category_id, after_id, limit)
 
 @router.post("/bookmarks", response_model=BookmarkOut)
 async def add_bookmark(
     data: BookmarkCreate,
     current_user: dict = Depends(get_current_user)
 ):
-    # Check if already bookmarked
-    exists = await bookmarks_collection.find_one({"user_id": str(current_user["_id"]), "exam_id": data.exam_id})
-    if exists:
-        raise Exception("Already bookmarked")
     doc = {
         "user_id": str(current_user["_id"]),
         "exam_id": data.exam_id,
-        "created_at": datetime.utcnow()
+        "created_at": datetime.now(timezone.utc)
     }
-    result = await bookmarks_collection.insert_one(doc)
+    # The unique (user_id, exam_id) index rejects a repeat; pre-check only while it is missing
+    if BOOKMARK_UNIQUE not in ready_unique_indexes:
+        if await bookmarks_collection.find_one({"user_id": doc["user_id"], "exam_id": doc["exam_id"]}, {"_id": 1}):
+            raise HTTPException(status_code=409, detail="Already bookmarked")
+    try:
+        result = await bookmarks_collection.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Already bookmarked")
     doc["id"] = str(result.inserted_id)
     return BookmarkOut(**doc)
 
@@ -127,68 +150,65 @@ async def remove_bookmark(
 ):
     result = await bookmarks_collection.delete_one({"user_id": str(current_user["_id"]), "exam_id": exam_id})
     if result.deleted_count == 0:
-        raise Exception("Bookmark not found")
+        raise HTTPException(status_code=404, detail="Bookmark not found")
     return {"message": "Bookmark removed"}
 
 @router.get("/bookmarks", response_model=List[BookmarkOut])
 async def list_bookmarks(current_user: dict = Depends(get_current_user)):
-    bookmarks = []
-    async for doc in bookmarks_collection.find({"user_id": str(current_user["_id"])}):
-        doc["id"] = str(doc["_id"])
-        bookmarks.append(BookmarkOut(**doc))
-    return bookmarks
+    docs = await bookmarks_collection.find({"user_id": str(current_user["_id"])}, BOOKMARK_PROJECTION).to_list(length=None)
+    return [BookmarkOut(id=str(doc["_id"]), user_id=doc["user_id"], exam_id=doc["exam_id"], created_at=doc["created_at"]) for doc in docs]
 
 @router.get("/exams/{exam_id}/questions", response_model=List[dict])
 async def get_exam_questions(exam_id: str):
     cache_key = f"exam_questions:{exam_id}"
     cached = await redis_client.get(cache_key)
     if cached:
-        from bson import json_util
-        return json_util.loads(cached)
-    questions = []
-    async for q in exam_questions_collection.find({"exam_id": exam_id}):
-        q["id"] = str(q["_id"])
-        del q["_id"]
-        questions.append(q)
-    from bson import json_util
-    await redis_client.set(cache_key, json_util.dumps(questions), ex=CACHE_EXPIRE_SECONDS)
+        return Response(content=cached, media_type="application/json")
+    questions = await exam_questions_collection.find({"exam_id": exam_id}).to_list(length=None)
+    for q in questions:
+        q["id"] = str(q.pop("_id"))
+    await redis_client.set(cache_key, orjson.dumps(questions, default=str), ex=CACHE_EXPIRE_SECONDS)
     return questions
 
+async def upsert_draft(user_id: str, exam_id: str, doc: dict) -> ObjectId:
+    """Write *doc* over the user's draft for the exam (creating it if missing) in one round trip; returns its _id."""
+    query = {"user_id": user_id, "exam_id": exam_id, "is_draft": True}
+    for attempt in range(2):
+        try:
+            result = await exam_submissions_collection.find_one_and_update(
+                query,
+                {"$set": doc},
+                projection={"_id": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return result["_id"]
+        except DuplicateKeyError:
+            # A concurrent request inserted the draft first; the retry updates it instead
+            if attempt:
+                raise
+
 @router.post("/exams/{exam_id}/submit")
 async def submit_exam(
     exam_id: str,
     submission: dict = Body(...),
     current_user: dict = Depends(get_current_user)
 ):
-    # Check if there's an existing draft to update
-    existing_draft = await exam_submissions_collection.find_one({
-        "user_id": str(current_user["_id"]),
-        "exam_id": exam_id,
-        "is_draft": True
-    })
-    
+    now = datetime.now(timezone.utc)
     doc = {
         "user_id": str(current_user["_id"]),
         "exam_id": exam_id,
         "answers": submission.get("answers", []),
-        "submitted_at": datetime.utcnow(),
+        "answered_count": _count_answered(submission.get("answers", [])),
+        "submitted_at": now,
         "time_spent": submission.get("time_spent", 0),
         "is_draft": False
     }
     
-    if existing_draft:
-        # Update existing draft to completed submission
-        await exam_submissions_collection.update_one(
-            {"_id": existing_draft["_id"]},
-            {"$set": doc}
-        )
-        await update_user_streak(str(current_user["_id"]))
-        return {"submission_id": str(existing_draft["_id"]), "exam_id": exam_id}
-    else:
-        # Create new submission
-        result = await exam_submissions_collection.insert_one(doc)
-        await update_user_streak(str(current_user["_id"]))
-        return {"submission_id": str(result.inserted_id), "exam_id": exam_id}
+    # Complete the existing draft, or create the submission if there was none
+    submission_id = await upsert_draft(str(current_user["_id"]), exam_id, doc)
+    await update_user_streak(str(current_user["_id"]), now.astimezone().date())
+    return {"submission_id": str(submission_id), "exam_id": exam_id}
 
 @router.post("/exams/{exam_id}/save-progress")
 async def save_exam_progress(
@@ -197,68 +217,69 @@ async def save_exam_progress(
     current_user: dict = Depends(get_current_user)
 ):
     """Save exam progress (auto-save functionality)"""
-    # Check if there's an existing progress save
-    existing = await exam_submissions_collection.find_one({
-        "user_id": str(current_user["_id"]),
-        "exam_id": exam_id,
-        "is_draft": True
-    })
-    
     doc = {
         "user_id": str(current_user["_id"]),
         "exam_id": exam_id,
         "answers": submission.get("answers", []),
+        "answered_count": _count_answered(submission.get("answers", [])),
         "is_draft": submission.get("is_draft", True),
-        "saved_at": datetime.utcnow(),
+        "saved_at": datetime.now(timezone.utc),
         "time_spent": submission.get("time_spent", 0)
     }
     
-    if existing:
-        # Update existing draft
-        await exam_submissions_collection.update_one(
-            {"_id": existing["_id"]},
-            {"$set": doc}
-        )
-        return {"message": "Progress saved", "submission_id": str(existing["_id"])}
-    else:
-        # Create new draft
-        result = await exam_submissions_collection.insert_one(doc)
-        return {"message": "Progress saved", "submission_id": str(result.inserted_id)}
+    # Update the existing draft or create a new one
+    submission_id = await upsert_draft(str(current_user["_id"]), exam_id, doc)
+    return {"message": "Progress saved", "submission_id": str(submission_id)}
 
 # === EXAM CATEGORY MANAGEMENT FOR USERS ===
-@router.get("/exam-categories", response_model=List[ExamCategoryOut])
-async def user_list_exam_categories():
+# Categories rarely change, so each worker keeps the JSON in memory for a short while
+# in front of Redis: (expires_at, payload)
+CATEGORY_MEMO_SECONDS = 60
+CATEGORY_MEMO_MAX = 2048
+_categories_memo: Optional[tuple] = None
+_categories_lock = asyncio.Lock()
+_category_memo: dict = {}
+
+async def _load_categories_json() -> bytes:
     cache_key = "exam_categories:all"
     cached = await redis_client.get(cache_key)
     if cached:
-        from bson import json_util
-        return [ExamCategoryOut(**cat) for cat in json_util.loads(cached)]
-    categories = []
-    async for cat in exam_categories_collection.find():
-        categories.append(ExamCategoryOut(
-            id=str(cat["_id"]),
-            name=cat["name"],
-            description=cat.get("description", ""),
-            english_name=cat.get("english_name", "")
-        ).model_dump())
-    from bson import json_util
-    await redis_client.set(cache_key, json_util.dumps(categories), ex=CACHE_EXPIRE_SECONDS)
-    # cast back to pydantic models
-    return [ExamCategoryOut(**cat) for cat in categories]
+        return cached
+    docs = await exam_categories_collection.find({}, EXAM_CATEGORY_PROJECTION).to_list(length=None)
+    categories = [ExamCategoryOut(
+        id=str(cat["_id"]),
+        name=cat["name"],
+        description=cat.get("description", ""),
+        english_name=cat.get("english_name", "")
+    ).model_dump() for cat in docs]
+    payload = orjson.dumps(categories)
+    await redis_client.set(cache_key, payload, ex=CACHE_EXPIRE_SECONDS)
+    return payload
+
+@router.get("/exam-categories", response_model=List[ExamCategoryOut])
+async def user_list_exam_categories():
+    global _categories_memo
+    if _categories_memo is None or _categories_memo[0] <= time.monotonic():
+        async with _categories_lock:
+            # Another request may have refreshed it while we waited
+            if _categories_memo is None or _categories_memo[0] <= time.monotonic():
+                _categories_memo = (time.monotonic() + CATEGORY_MEMO_SECONDS, await _load_categories_json())
+    return Response(content=_categories_memo[1], media_type="application/json")
 
 
 @router.get("/exam-categories/{category_id}", response_model=ExamCategoryOut)
 async def user_get_exam_category(category_id: str):
+    if not ObjectId.is_valid(category_id):
+        raise HTTPException(status_code=400, detail="Invalid category ID format")
+    memo = _category_memo.get(category_id)
+    if memo and memo[0] > time.monotonic():
+        return Response(content=memo[1], media_type="application/json")
     cache_key = f"exam_category:{category_id}"
     cached = await redis_client.get(cache_key)
     if cached:
-        from bson import json_util
-        return ExamCategoryOut(**json_util.loads(cached))
-    try:
-        oid = ObjectId(category_id)
-    except:
-        raise HTTPException(status_code=400, detail="Invalid category ID format")
-    cat = await exam_categories_collection.find_one({"_id": oid})
+        _memoize_category(category_id, cached)
+        return Response(content=cached, media_type="application/json")
+    cat = await exam_categories_collection.find_one({"_id": ObjectId(category_id)}, EXAM_CATEGORY_PROJECTION)
     if not cat:
         raise HTTPException(status_code=404, detail="Category not found")
 
@@ -268,9 +289,39 @@ async def user_get_exam_category(category_id: str):
         description=cat.get("description", ""),
         english_name=cat.get("english_name", "")
     )
-    from bson import json_util
-    await redis_client.set(cache_key, json_util.dumps(result.model_dump()), ex=CACHE_EXPIRE_SECONDS)
-    return result
+    payload = orjson.dumps(result.model_dump())
+    await redis_client.set(cache_key, payload, ex=CACHE_EXPIRE_SECONDS)
+    _memoize_category(category_id, payload)
+    return Response(content=payload, media_type="application/json")
+
+def _memoize_category(category_id: str, payload: bytes):
+    _category_memo.pop(category_id, None)
+    if len(_category_memo) >= CATEGORY_MEMO_MAX:
+        _category_memo.pop(next(iter(_category_memo)))  # oldest first
+    _category_memo[category_id] = (time.monotonic() + CATEGORY_MEMO_SECONDS, payload)
+
+def _count_answered(answers: list) -> int:
+    """Answers with a non-blank value. Stored on the submission as `answered_count` (see database.ANSWERED_COUNT_EXPR)."""
+    if not isinstance(answers, list):
+        return 0
+    return len([a for a in answers if isinstance(a, dict) and a.get("answer") and str(a.get("answer")).strip()])
+
+# Stored on the submission; counted from the answers only for submissions written without it
+STORED_ANSWERED_COUNT = {"$ifNull": ["$answered_count", ANSWERED_COUNT_EXPR]}
+
+# Attach the submission's exam file as `exam`; submissions whose exam is gone (or whose
+# exam_id isn't an ObjectId) drop out
+EXAM_FILE_LOOKUP = [
+    {"$addFields": {"exam_oid": {"$convert": {"input": "$exam_id", "to": "objectId", "onError": None, "onNull": None}}}},
+    {"$lookup": {"from": "exam_files", "localField": "exam_oid", "foreignField": "_id", "as": "exam"}},
+    {"$unwind": "$exam"},
+]
+
+# Stored on the exam file; summed only for files not yet backfilled
+TOTAL_QUESTIONS_EXPR = {"$ifNull": [
+    "$exam.total_questions",
+    {"$add": [{"$ifNull": ["$exam.essay_count", 0]}, {"$ifNull": ["$exam.choice_count", 0]}]},
+]}
 
 @router.get("/exams-with-progress", response_model=List[dict])
 async def user_list_exams_with_progress(
@@ -281,8 +332,18 @@ async def user_list_exams_with_progress(
     """Get exams with user's progress information"""
     skip = (page - 1) * limit
     files = []
-    
-    async for file_doc in exam_files_collection.find().skip(skip).limit(limit):
+    file_docs = await exam_files_collection.find({}, EXAM_FILE_PROJECTION).skip(skip).limit(limit).to_list(length=limit)
+
+    # Latest submission (completed or draft) per exam on this page, in one query
+    submissions = await exam_submissions_collection.find({
+        "user_id": str(current_user["_id"]),
+        "exam_id": {"$in": [str(file_doc["_id"]) for file_doc in file_docs]}
+    }, {"exam_id": 1, "answered_count": STORED_ANSWERED_COUNT, "is_draft": 1, "saved_at": 1, "submitted_at": 1}).sort([("submitted_at", -1), ("saved_at", -1)]).to_list(length=None)
+    latest = {}
+    for submission in submissions:
+        latest.setdefault(submission["exam_id"], submission)
+
+    for file_doc in file_docs:
         exam_file = {
             "id": str(file_doc["_id"]),
             "title": file_doc["title"],
@@ -296,15 +357,10 @@ async def user_list_exams_with_progress(
             "is_completed": False
         }
         
-        # Check for submissions (completed or draft)
-        submission = await exam_submissions_collection.find_one({
-            "user_id": str(current_user["_id"]),
-            "exam_id": str(file_doc["_id"])
-        }, sort=[("submitted_at", -1), ("saved_at", -1)])
-        
+        submission = latest.get(str(file_doc["_id"]))
         if submission:
-            total_questions = file_doc.get("essay_count", 0) + file_doc.get("choice_count", 0)
-            answered_count = len([a for a in submission.get("answers", []) if a.get("answer") and str(a.get("answer")).strip()])
+            total_questions = file_doc.get("total_questions", file_doc.get("essay_count", 0) + file_doc.get("choice_count", 0))
+            answered_count = submission.get("answered_count", 0)
             
             exam_file["progress"] = {
                 "answered_count": answered_count,
@@ -324,20 +380,27 @@ async def user_list_exams_with_progress(
 async def get_exam_progress(current_user: dict = Depends(get_current_user)):
     """Get user's exam progress for all exams"""
     progress_data = []
-    
-    async for submission in exam_submissions_collection.find({"user_id": str(current_user["_id"])}):
-        exam_id = submission["exam_id"]
-        
-        # Get exam file to calculate total questions
-        exam_file = await exam_files_collection.find_one({"_id": ObjectId(exam_id)})
-        if not exam_file:
-            continue
-            
-        total_questions = exam_file.get("essay_count", 0) + exam_file.get("choice_count", 0)
-        answered_count = len([a for a in submission.get("answers", []) if a.get("answer") and str(a.get("answer")).strip()])
-        
+    pipeline = [
+        {"$match": {"user_id": str(current_user["_id"])}},
+        *EXAM_FILE_LOOKUP,
+        {"$project": {
+            "_id": 0,
+            "exam_id": 1,
+            "saved_at": 1,
+            "submitted_at": 1,
+            "is_draft": 1,
+            "time_spent": 1,
+            "answered_count": STORED_ANSWERED_COUNT,
+            "total_questions": TOTAL_QUESTIONS_EXPR,
+        }},
+    ]
+
+    async for submission in exam_submissions_collection.aggregate(pipeline):
+        total_questions = submission["total_questions"]
+        answered_count = submission["answered_count"]
+
         progress_data.append({
-            "exam_id": exam_id,
+            "exam_id": submission["exam_id"],
             "progress_percentage": (answered_count / total_questions * 100) if total_questions > 0 else 0,
             "answered_count": answered_count,
             "total_questions": total_questions,
@@ -352,46 +415,56 @@ async def get_exam_progress(current_user: dict = Depends(get_current_user)):
 async def get_in_progress_exams(current_user: dict = Depends(get_current_user)):
     """Get all exams that are currently in progress (drafts with answers)"""
     in_progress_exams = []
-    
-    # Find all draft submissions with answers
-    async for submission in exam_submissions_collection.find({
-        "user_id": str(current_user["_id"]),
-        "is_draft": True,
-        "answers": {"$exists": True, "$ne": []}
-    }).sort("saved_at", -1):
-        
-        exam_id = submission["exam_id"]
-        
-        # Get exam file details
-        try:
-            exam_file = await exam_files_collection.find_one({"_id": ObjectId(exam_id)})
-            if not exam_file:
-                continue
-                
-            total_questions = exam_file.get("essay_count", 0) + exam_file.get("choice_count", 0)
-            answered_count = len([a for a in submission.get("answers", []) if a.get("answer") and str(a.get("answer")).strip()])
-            
-            # Only include if there are actual answers
-            if answered_count > 0:
-                in_progress_exams.append({
-                    "exam_id": exam_id,
-                    "title": exam_file["title"],
-                    "description": exam_file["description"],
-                    "tags": exam_file.get("tags", []),
-                    "url": exam_file["url"],
-                    "essay_count": exam_file.get("essay_count", 0),
-                    "choice_count": exam_file.get("choice_count", 0),
-                    "progress_percentage": (answered_count / total_questions * 100) if total_questions > 0 else 0,
-                    "answered_count": answered_count,
-                    "total_questions": total_questions,
-                    "last_saved": submission.get("saved_at"),
-                    "time_spent": submission.get("time_spent", 0),
-                    "submission_id": str(submission["_id"])
-                })
-        except Exception as e:
-            print(f"Error processing exam {exam_id}: {e}")
-            continue
-    
+    pipeline = [
+        # Find all draft submissions with actual answers (or, if saved without a stored
+        # count, with any answers to count below)
+        {"$match": {
+            "user_id": str(current_user["_id"]),
+            "is_draft": True,
+            "$or": [
+                {"answered_count": {"$gt": 0}},
+                {"answered_count": {"$exists": False}, "answers": {"$exists": True, "$ne": []}},
+            ]
+        }},
+        {"$sort": {"saved_at": -1}},
+        {"$addFields": {"answered_count": STORED_ANSWERED_COUNT}},
+        {"$match": {"answered_count": {"$gt": 0}}},
+        *EXAM_FILE_LOOKUP,
+        {"$project": {
+            "exam_id": 1,
+            "saved_at": 1,
+            "time_spent": 1,
+            "answered_count": 1,
+            "total_questions": TOTAL_QUESTIONS_EXPR,
+            "exam.title": 1,
+            "exam.description": 1,
+            "exam.tags": 1,
+            "exam.url": 1,
+            "exam.essay_count": 1,
+            "exam.choice_count": 1,
+        }},
+    ]
+
+    async for submission in exam_submissions_collection.aggregate(pipeline):
+        exam_file = submission["exam"]
+        total_questions = submission["total_questions"]
+        answered_count = submission["answered_count"]
+        in_progress_exams.append({
+            "exam_id": submission["exam_id"],
+            "title": exam_file["title"],
+            "description": exam_file["description"],
+            "tags": exam_file.get("tags", []),
+            "url": exam_file["url"],
+            "essay_count": exam_file.get("essay_count", 0),
+            "choice_count": exam_file.get("choice_count", 0),
+            "progress_percentage": (answered_count / total_questions * 100) if total_questions > 0 else 0,
+            "answered_count": answered_count,
+            "total_questions": total_questions,
+            "last_saved": submission.get("saved_at"),
+            "time_spent": submission.get("time_spent", 0),
+            "submission_id": str(submission["_id"])
+        })
+
     return in_progress_exams
 
 @router.delete("/exams/{exam_id}/progress")
@@ -414,35 +487,38 @@ async def clear_exam_progress(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to clear progress: {str(e)}")
 
-async def update_user_streak(user_id: str):
-    today = date.today()
-    today_str = today.isoformat()
-    key = f"streak:{user_id}"
-    data = await redis_client.hgetall(key)
-    if not data:
-        await redis_client.hset(key, mapping={"current": 1, "last_date": today_str, "revives_used": 0})
-        await redis_client.expire(key, STREAK_TTL_SECONDS)
-        return
-
-    last_date_str = data.get("last_date")
-    current = int(data.get("current", 0))
-    revives = int(data.get("revives_used", 0))
-
-    if last_date_str == today_str:
-        return  # already counted
-
-    last_date = date.fromisoformat(last_date_str)
-    if last_date == today - timedelta(days=1):
-        current += 1  # consecutive day
-    else:
-        # missed day(s)
-        if revives < 3:
-            current += 1  # revive keeps streak
-            revives += 1
-        else:
-            current = 1  # reset streak
-    await redis_client.hset(key, mapping={"current": current, "last_date": today_str, "revives_used": revives})
-    await redis_client.expire(key, STREAK_TTL_SECONDS)
+# Read-modify-write of the streak hash in one atomic round trip.
+# KEYS[1] = streak key, ARGV = today, yesterday (ISO dates), TTL seconds
+_STREAK_SCRIPT = redis_client.register_script("""
+local data = redis.call('HMGET', KEYS[1], 'current', 'last_date', 'revives_used')
+local current = tonumber(data[1]) or 0
+local last_date = data[2]
+local revives = tonumber(data[3]) or 0
+if not last_date then
+    current = 1
+    revives = 0
+elseif last_date == ARGV[1] then
+    return {current, revives}  -- already counted
+elseif last_date == ARGV[2] then
+    current = current + 1  -- consecutive day
+elseif revives < 3 then
+    current = current + 1  -- missed day(s): revive keeps streak
+    revives = revives + 1
+else
+    current = 1  -- reset streak
+end
+redis.call('HSET', KEYS[1], 'current', current, 'last_date', ARGV[1], 'revives_used', revives)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {current, revives}
+""")
+
+async def update_user_streak(user_id: str, today: date):
+    """*today* is the caller's local calendar date."""
+    yesterday = today - timedelta(days=1)
+    await _STREAK_SCRIPT(
+        keys=[f"streak:{user_id}"],
+        args=[today.isoformat(), yesterday.isoformat(), STREAK_TTL_SECONDS],
+    )
 
 class StreakInfo(BaseModel):
     current: int
@@ -454,9 +530,14 @@ async def get_streak(current_user: dict = Depends(get_current_user)):
     data = await redis_client.hgetall(key)
     if not data:
         return {"current": 0, "revives_used": 0}
-    return {"current": int(data.get("current", 0)), "revives_used": int(data.get("revives_used", 0))}
+    return {"current": int(data.get(b"current", 0)), "revives_used": int(data.get(b"revives_used", 0))}
 
 
+@functools.lru_cache(maxsize=4096)
+def _compile_answer_pattern(pat: str) -> re.Pattern:
+    """Answer-key patterns are reused across requests; compile each once per process."""
+    return re.compile(pat, re.IGNORECASE)
+
 @router.post("/exams/{exam_id}/check-answer", response_model=AnswerCheckResult)
 async def check_answer(
     exam_id: str,
@@ -468,10 +549,9 @@ async def check_answer(
     For fill/essay we treat the stored answer as case-insensitive regex (or list of regex patterns) and evaluate with `re`.
     """
     # Fetch question
-    try:
-        qdoc = await exam_questions_collection.find_one({"_id": ObjectId(payload.question_id), "exam_id": exam_id})
-    except Exception:
+    if not ObjectId.is_valid(payload.question_id):
         raise HTTPException(status_code=400, detail="Invalid question ID")
+    qdoc = await exam_questions_collection.find_one({"_id": ObjectId(payload.question_id), "exam_id": exam_id}, {"answer": 1, "type": 1})
 
     if not qdoc:
         raise HTTPException(status_code=404, detail="Question not found")
@@ -481,8 +561,6 @@ async def check_answer(
     q_type = qdoc.get("type")
     user_answer = payload.answer.strip() if isinstance(payload.answer, str) else payload.answer
 
-    import re, json
-
     if q_type == "multiple_choice":
         # stored answer could be str or list
         if isinstance(q_answer, list):
@@ -494,7 +572,7 @@ async def check_answer(
         patterns = q_answer if isinstance(q_answer, list) else [q_answer]
         for pat in patterns:
             try:
-                if re.fullmatch(pat, user_answer, flags=re.IGNORECASE):
+                if _compile_answer_pattern(pat).fullmatch(user_answer):
                     correct = True
                     break
             except re.error:
@@ -505,29 +583,34 @@ async def check_answer(
     # update streak only when answer is correct and first time today maybe; we will call update_user_streak in submit_exam instead
     return {"correct": correct}
 
-@router.post("/exams/{exam_id}/update-activity")
-async def update_exam_activity(
-    exam_id: str,
-    current_user: dict = Depends(get_current_user)
-):
-    """Update user's last activity timestamp for an exam"""
+# Strong references to in-flight background writes; the loop only keeps weak ones
+_background_tasks: set = set()
+
+async def _record_activity(user_id: str, exam_id: str, now: datetime):
     try:
-        # Update or create activity record
         await exam_submissions_collection.update_one(
             {
-                "user_id": str(current_user["_id"]),
+                "user_id": user_id,
                 "exam_id": exam_id,
                 "is_draft": True
             },
             {
                 "$set": {
-                    "last_activity": datetime.utcnow()
+                    "last_activity": now
                 }
             },
             upsert=False  # Only update if exists
         )
-        
-        return {"message": "Activity updated"}
-    except Exception as e:
-        # Don't fail the request if activity update fails
-        return {"message": "Activity update skipped"}
+    except Exception:
+        pass  # activity is best-effort
+
+@router.post("/exams/{exam_id}/update-activity")
+async def update_exam_activity(
+    exam_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Update user's last activity timestamp for an exam (written in the background)"""
+    task = asyncio.create_task(_record_activity(str(current_user["_id"]), exam_id, datetime.now(timezone.utc)))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return {"message": "Activity updated"}
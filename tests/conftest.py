@@ -0,0 +1,44 @@
+import fakeredis
+import mongomock
+import pytest
+
+
+class AsyncCursor:
+    """The slice of Motor's cursor API the app uses, over a mongomock cursor."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, n):
+        self._cursor.limit(n)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self._cursor)
+
+
+class AsyncCollection:
+    """Just enough of a Motor collection for the helpers under test."""
+
+    def __init__(self, collection):
+        self.sync = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.sync.find(*args, **kwargs))
+
+    async def find_one(self, *args, **kwargs):
+        return self.sync.find_one(*args, **kwargs)
+
+
+@pytest.fixture
+def fake_redis():
+    return fakeredis.FakeAsyncRedis()
+
+
+@pytest.fixture
+def mongo_collection():
+    return AsyncCollection(mongomock.MongoClient().db.collection)
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from app.database import ANSWERED_COUNT_EXPR
+from app.settings import MONGO_URI
+from app.user import STORED_ANSWERED_COUNT, _count_answered
+
+# (answers, non-blank count)
+CASES = [
+    (None, 0),
+    ("not a list", 0),
+    ([], 0),
+    ([{"answer": "a"}], 1),
+    ([{"answer": "  "}, {"answer": ""}, {"answer": "\t\n"}], 0),
+    ([{"answer": None}, {}], 0),
+    ([{"answer": []}, {"answer": ["a"]}, {"answer": [" "]}], 2),
+    ([{"answer": "a"}, {"answer": " "}, {"answer": ["b", "c"]}, "stray"], 2),
+]
+
+
+@pytest.fixture(scope="module")
+def submissions():
+    # mongomock can't evaluate $type/$trim, so parity needs a real server
+    client = MongoClient(os.getenv("TEST_MONGO_URI", MONGO_URI), serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("no MongoDB reachable (set TEST_MONGO_URI)")
+    collection = client["examtie_test"]["answered_count_parity"]
+    collection.drop()
+    yield collection
+    collection.drop()
+    client.close()
+
+
+def evaluate(collection, expr, doc):
+    collection.delete_many({})
+    collection.insert_one(doc)
+    return next(collection.aggregate([{"$project": {"n": expr}}]))["n"]
+
+
+@pytest.mark.parametrize("answers, expected", CASES)
+def test_count_answered(answers, expected):
+    assert _count_answered(answers) == expected
+
+
+@pytest.mark.parametrize("answers, expected", CASES)
+def test_expression_matches_python(submissions, answers, expected):
+    assert evaluate(submissions, ANSWERED_COUNT_EXPR, {"answers": answers}) == expected
+
+
+def test_stored_count_wins_over_recount(submissions):
+    doc = {"answers": [{"answer": "a"}], "answered_count": 7}
+    assert evaluate(submissions, STORED_ANSWERED_COUNT, doc) == 7
+    assert evaluate(submissions, STORED_ANSWERED_COUNT, {"answers": [{"answer": "a"}]}) == 1
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from app import dependencies
+
+
+class GatedUsers:
+    """users_collection stub whose find_one blocks until `gate` is set, counting calls."""
+
+    def __init__(self, user):
+        self.user = user
+        self.calls = 0
+        self.gate = asyncio.Event()
+
+    async def find_one(self, query):
+        self.calls += 1
+        await self.gate.wait()
+        return self.user
+
+
+@pytest.fixture
+def users(monkeypatch, fake_redis):
+    stub = GatedUsers({"_id": ObjectId(), "email": "a@example.com", "username": "alice", "roles": ["user"]})
+    monkeypatch.setattr(dependencies, "users_collection", stub)
+    monkeypatch.setattr(dependencies, "redis_client", fake_redis)
+    return stub
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_query(users, fake_redis):
+    tasks = [asyncio.create_task(dependencies._load_user("user:a@example.com", {"email": "a@example.com"})) for _ in range(5)]
+    await settle()
+    users.gate.set()
+    results = await asyncio.gather(*tasks)
+
+    assert users.calls == 1
+    assert all(r is users.user for r in results)
+    assert await fake_redis.exists("user:a@example.com", "user_by_username:alice") == 2
+    assert not dependencies._inflight
+
+
+@pytest.mark.asyncio
+async def test_waiters_retry_when_leader_is_cancelled(users):
+    query = {"email": "a@example.com"}
+    leader = asyncio.create_task(dependencies._load_user("user:a@example.com", query))
+    await settle()
+    waiters = [asyncio.create_task(dependencies._load_user("user:a@example.com", query)) for _ in range(3)]
+    await settle()
+
+    leader.cancel()
+    await settle()
+    users.gate.set()
+    results = await asyncio.gather(*waiters)
+
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    # The cancelled leader's query, then one retry shared by every waiter
+    assert users.calls == 2
+    assert all(r is users.user for r in results)
+    assert not dependencies._inflight
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_disturb_leader(users):
+    query = {"email": "a@example.com"}
+    leader = asyncio.create_task(dependencies._load_user("user:a@example.com", query))
+    await settle()
+    waiter = asyncio.create_task(dependencies._load_user("user:a@example.com", query))
+    await settle()
+
+    waiter.cancel()
+    await settle()
+    users.gate.set()
+
+    assert await leader is users.user
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert users.calls == 1
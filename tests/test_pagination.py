@@ -0,0 +1,55 @@
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.admin import decode_cursor, encode_cursor, paginate
+
+
+def test_cursor_round_trips():
+    oid = ObjectId()
+    cursor = encode_cursor(oid)
+    assert "/" not in cursor and "+" not in cursor
+    assert decode_cursor(cursor) == oid
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "AAAA", ""])
+def test_bad_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+@pytest.fixture
+def ids(mongo_collection):
+    oids = sorted(ObjectId() for _ in range(20))
+    mongo_collection.sync.insert_many([{"_id": oid, "even": i % 2 == 0} for i, oid in enumerate(oids)])
+    return oids
+
+
+async def walk(collection, query, limit, descending=False):
+    pages, cursor = [], None
+    while True:
+        docs, cursor, has_more = await paginate(collection, dict(query), cursor, limit, descending=descending)
+        pages.append([d["_id"] for d in docs])
+        assert has_more == (cursor is not None)
+        if not has_more:
+            return pages
+
+
+@pytest.mark.asyncio
+async def test_pages_cover_everything_once(mongo_collection, ids):
+    pages = await walk(mongo_collection, {}, 7)
+    assert [len(p) for p in pages] == [7, 7, 6]
+    assert sum(pages, []) == ids
+
+
+@pytest.mark.asyncio
+async def test_exact_multiple_has_no_empty_last_page(mongo_collection, ids):
+    pages = await walk(mongo_collection, {}, 10)
+    assert [len(p) for p in pages] == [10, 10]
+
+
+@pytest.mark.asyncio
+async def test_descending_with_filter(mongo_collection, ids):
+    pages = await walk(mongo_collection, {"even": True}, 4, descending=True)
+    assert sum(pages, []) == ids[::2][::-1]
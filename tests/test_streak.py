@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app import user
+
+USER = {"_id": "u1"}
+DAY = date(2024, 1, 10)
+
+
+@pytest.fixture
+def redis(monkeypatch, fake_redis):
+    monkeypatch.setattr(user, "redis_client", fake_redis)
+    monkeypatch.setattr(user, "_STREAK_SCRIPT", fake_redis.register_script(user._STREAK_SCRIPT.script))
+    return fake_redis
+
+
+async def visit(day):
+    await user.update_user_streak(USER["_id"], day)
+    return await user.get_streak(current_user=USER)
+
+
+@pytest.mark.asyncio
+async def test_no_activity_is_zero(redis):
+    assert await user.get_streak(current_user=USER) == {"current": 0, "revives_used": 0}
+
+
+@pytest.mark.asyncio
+async def test_first_day_starts_streak(redis):
+    assert await visit(DAY) == {"current": 1, "revives_used": 0}
+    assert 0 < await redis.ttl("streak:u1") <= user.STREAK_TTL_SECONDS
+
+
+@pytest.mark.asyncio
+async def test_same_day_counts_once(redis):
+    await visit(DAY)
+    assert await visit(DAY) == {"current": 1, "revives_used": 0}
+
+
+@pytest.mark.asyncio
+async def test_consecutive_days_extend_streak(redis):
+    for offset in range(3):
+        streak = await visit(DAY + timedelta(days=offset))
+    assert streak == {"current": 3, "revives_used": 0}
+
+
+@pytest.mark.asyncio
+async def test_missed_days_use_revives_then_reset(redis):
+    await visit(DAY)
+    day = DAY
+    for revives in range(1, 4):
+        day += timedelta(days=3)
+        assert await visit(day) == {"current": 1 + revives, "revives_used": revives}
+
+    # Out of revives: the next gap starts over
+    day += timedelta(days=2)
+    assert await visit(day) == {"current": 1, "revives_used": 3}
+    assert await visit(day + timedelta(days=1)) == {"current": 2, "revives_used": 3}